@@ -0,0 +1,152 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from functools import wraps
+from threading import Event
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.handlers.asgi import ASGIHandler
+from django.db import close_old_connections
+from rest_framework.permissions import SAFE_METHODS
+
+# Эндпоинты чтения, которые в режиме ASGI обслуживаются параллельно.
+ASYNC_READ_ROUTES = (
+    'tags-list',
+    'tags-detail',
+    'ingredients-list',
+    'ingredients-detail',
+    'recipes-list',
+    'recipes-detail',
+    'recipes-download-shopping-cart',
+    'recipes-feed',
+)
+
+executor = ThreadPoolExecutor(
+    max_workers=settings.ASYNC_VIEW_THREADS,
+    thread_name_prefix='views',
+)
+# Сколько частей потокового ответа может ждать отправки клиенту.
+STREAM_BUFFER = 8
+END = object()
+
+
+def run_view(view, request, *args, **kwargs):
+    """
+    Выполняет представление целиком в потоке пула.
+
+    Соединения с БД у каждого потока свои, поэтому закрываются здесь же:
+    сигналы запроса Django обрабатывает в другом потоке.
+    """
+    close_old_connections()
+    try:
+        response = view(request, *args, **kwargs)
+        if hasattr(response, 'render') and callable(response.render):
+            response.render()
+        if response.streaming:
+            # ASGI-обработчик Django 3.2 читает поток в цикле событий,
+            # где запросы к БД запрещены: поток по частям читает
+            # StreamingASGIHandler в пуле потоков. Сам поток берётся уже
+            # после middleware, которые могут его обернуть.
+            response.pooled_streaming = True
+        return response
+    finally:
+        close_old_connections()
+
+
+def pump(content, queue, loop, stopped):
+    """Читает потоковый ответ в потоке пула и передаёт части в цикл."""
+    result = END
+    close_old_connections()
+    try:
+        for part in content:
+            if stopped.is_set():
+                return
+            asyncio.run_coroutine_threadsafe(queue.put(part), loop).result()
+    except Exception as error:
+        result = error
+    finally:
+        close_old_connections()
+    if not stopped.is_set():
+        asyncio.run_coroutine_threadsafe(queue.put(result), loop).result()
+
+
+async def pooled_stream(content):
+    """
+    Части потокового ответа, прочитанные в одном потоке пула.
+
+    Очередь ограничена, поэтому в памяти не больше STREAM_BUFFER частей.
+    """
+    loop = asyncio.get_running_loop()
+    queue = asyncio.Queue(STREAM_BUFFER)
+    stopped = Event()
+    loop.run_in_executor(executor, pump, content, queue, loop, stopped)
+    try:
+        while True:
+            part = await queue.get()
+            if part is END:
+                return
+            if isinstance(part, Exception):
+                raise part
+            yield part
+    finally:
+        # Клиент отключился: освобождаем поток пула.
+        stopped.set()
+        while not queue.empty():
+            queue.get_nowait()
+
+
+class StreamingASGIHandler(ASGIHandler):
+    """
+    ASGI-обработчик, который отдаёт потоковые ответы из пула потоков.
+    """
+
+    async def send_response(self, response, send):
+        if not getattr(response, 'pooled_streaming', False):
+            return await super().send_response(response, send)
+        parts = pooled_stream(response.streaming_content)
+
+        async def send_parts(message):
+            # Части вставляются перед последним сообщением с телом.
+            if (
+                message['type'] == 'http.response.body'
+                and not message.get('more_body')
+            ):
+                async for part in parts:
+                    for chunk, _ in self.chunk_bytes(part):
+                        await send({
+                            'type': 'http.response.body',
+                            'body': chunk,
+                            'more_body': True,
+                        })
+            await send(message)
+
+        response.streaming_content = ()
+        try:
+            await super().send_response(response, send_parts)
+        finally:
+            await parts.aclose()
+
+
+def async_read_view(view):
+    """
+    Асинхронная обёртка над представлением DRF.
+
+    В Django 3.2 синхронные представления под ASGI выполняются в одном
+    общем потоке, то есть по очереди. Чтение уходит в пул потоков
+    и не ждёт других запросов, изменения выполняются как обычно.
+    """
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        if request.method in SAFE_METHODS:
+            return await sync_to_async(
+                run_view, thread_sensitive=False, executor=executor
+            )(view, request, *args, **kwargs)
+        return await sync_to_async(view)(request, *args, **kwargs)
+    return wrapper
+
+
+def async_read_urls(urlpatterns):
+    for pattern in urlpatterns:
+        if getattr(pattern, 'name', None) in ASYNC_READ_ROUTES:
+            pattern.callback = async_read_view(pattern.callback)
+    return urlpatterns
@@ -0,0 +1,369 @@
+import json
+import tempfile
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from threading import local
+
+import requests
+from django.db import connection, transaction
+from django.db.models import Count
+from django.test.utils import CaptureQueriesContext, override_settings
+from rest_framework.test import APIClient
+
+from api.cache import invalidate_all
+from api.generator import generate
+from api.user_state import clear_user_state
+from recipes.models import FavoriteRecipe, Ingredient, Recipe
+from tag.models import Tag
+from users.models import User
+
+
+class Scenario:
+    """Запрос к API, который замеряется в бенчмарке."""
+
+    def __init__(self, name, url, method='get', data=None, user=None):
+        self.name = name
+        self.url = url
+        self.method = method
+        self.data = data
+        self.user = user
+
+
+def percentile(values, share):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * share))]
+
+
+def request(client, scenario):
+    response = getattr(client, scenario.method)(
+        scenario.url, scenario.data, format='json'
+    )
+    if response.streaming:
+        b''.join(response.streaming_content)
+    return response
+
+
+def reset_cache(scenario):
+    invalidate_all()
+    if scenario.user is not None:
+        clear_user_state(scenario.user.pk)
+
+
+def measure(scenario, repeat, cold=False):
+    """
+    Время ответа, число запросов к БД и пик выделенной памяти.
+
+    Изменения данных откатываются после каждого запроса, а загруженные
+    файлы пишутся во временный каталог и удаляются вместе с ним. Память
+    замеряется отдельным прогоном: tracemalloc замедляет код.
+    При cold=True кэши ответов и состояние пользователя сбрасываются
+    перед каждым запросом.
+    """
+    with tempfile.TemporaryDirectory() as media_root:
+        with override_settings(MEDIA_ROOT=media_root):
+            return run_scenario(scenario, repeat, cold)
+
+
+def run_scenario(scenario, repeat, cold):
+    client = APIClient()
+    if scenario.user is not None:
+        client.force_authenticate(scenario.user)
+    timings = []
+    for _ in range(repeat):
+        if cold:
+            reset_cache(scenario)
+        with transaction.atomic():
+            with CaptureQueriesContext(connection) as queries:
+                started = time.perf_counter()
+                response = request(client, scenario)
+                timings.append(time.perf_counter() - started)
+            query_count = len(queries)
+            transaction.set_rollback(True)
+    if cold:
+        reset_cache(scenario)
+    with transaction.atomic():
+        tracemalloc.start()
+        try:
+            request(client, scenario)
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        transaction.set_rollback(True)
+    return {
+        'status': response.status_code,
+        'queries': query_count,
+        'p50': percentile(timings, 0.5) * 1000,
+        'p95': percentile(timings, 0.95) * 1000,
+        'memory': peak / 1024,
+    }
+
+
+def most_active_user():
+    """Пользователь с самым большим избранным."""
+    favorite = (
+        FavoriteRecipe.objects.values('user')
+        .annotate(total=Count('id'))
+        .order_by('-total')
+        .first()
+    )
+    if favorite is None:
+        return User.objects.first()
+    return User.objects.get(pk=favorite['user'])
+
+
+def recipe_filter_scenarios():
+    user = most_active_user()
+    author = User.objects.order_by('-recipes_count').first()
+    tags = '&'.join(
+        f'tags={slug}'
+        for slug in Tag.objects.values_list('slug', flat=True)[:2]
+    )
+    author_id = author.id if author else 0
+    return [
+        Scenario('recipes', '/api/recipes/'),
+        Scenario('recipes?tags', f'/api/recipes/?{tags}'),
+        Scenario('recipes?author', f'/api/recipes/?author={author_id}'),
+        Scenario(
+            'recipes?author&tags',
+            f'/api/recipes/?author={author_id}&{tags}',
+        ),
+        Scenario(
+            'recipes?is_favorited', '/api/recipes/?is_favorited=1',
+            user=user,
+        ),
+        Scenario(
+            'recipes?is_in_shopping_cart',
+            '/api/recipes/?is_in_shopping_cart=1', user=user,
+        ),
+        Scenario(
+            'recipes?is_favorited&tags',
+            f'/api/recipes/?is_favorited=1&{tags}', user=user,
+        ),
+        Scenario(
+            'recipes?cursor&tags', f'/api/recipes/?cursor=&{tags}',
+            user=user,
+        ),
+    ]
+
+
+# Картинка 1x1 PNG: в сценарии создания замеряется работа с ингредиентами.
+PIXEL = (
+    'data:image/png;base64,iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAYAAAAfFcSJAAAA'
+    'DUlEQVR42mP8z8DwHwAFBQIAX8jx0gAAAABJRU5ErkJggg=='
+)
+
+
+def recipe_create_scenarios(sizes=(10, 50, 200)):
+    """Создание рецептов с длинными списками ингредиентов."""
+    user = most_active_user()
+    tags = list(Tag.objects.values_list('id', flat=True))
+    scenarios = []
+    for size in sizes:
+        ingredients = list(
+            Ingredient.objects.values_list('id', flat=True)[:size]
+        )
+        scenarios.append(Scenario(
+            f'create recipe, {len(ingredients)} ingredients',
+            '/api/recipes/', method='post', user=user,
+            data={
+                'name': 'Бенчмарк',
+                'text': 'Рецепт для замера',
+                'cooking_time': 10,
+                'image': PIXEL,
+                'tags': tags,
+                'ingredients': [
+                    {'id': pk, 'amount': 1} for pk in ingredients
+                ],
+            },
+        ))
+    return scenarios
+
+
+def route_scenarios():
+    """По сценарию на каждый маршрут из api/urls.py."""
+    user = most_active_user()
+    recipe = (
+        Recipe.objects.filter(author=user).first() or Recipe.objects.first()
+    )
+    other = Recipe.objects.exclude(favorites__user=user).exclude(
+        shopping_cart__user=user
+    ).first() or recipe
+    author = User.objects.exclude(pk=user.pk).exclude(
+        following__user=user
+    ).first() or user
+    tag = Tag.objects.first()
+    week_menu = {'ids': list(
+        Recipe.objects.exclude(shopping_cart__user=user)
+        .values_list('id', flat=True)[:21]
+    )}
+    authors = {'ids': list(
+        User.objects.exclude(pk=user.pk).exclude(following__user=user)
+        .values_list('id', flat=True)[:20]
+    )}
+    ingredients = recipe.recipe_ingredient.values('ingredient', 'amount')
+    update = {
+        'ingredients': [
+            {'id': item['ingredient'], 'amount': item['amount'] + 1}
+            for item in ingredients
+        ],
+        'tags': list(recipe.tags.values_list('id', flat=True)),
+        'name': 'Бенчмарк',
+    }
+    return [
+        Scenario('users', '/api/users/', user=user),
+        Scenario('users/me', '/api/users/me/', user=user),
+        Scenario('users/{id}', f'/api/users/{author.id}/', user=user),
+        Scenario(
+            'users/subscriptions', '/api/users/subscriptions/', user=user
+        ),
+        Scenario(
+            'users/{id}/subscribe', f'/api/users/{author.id}/subscribe/',
+            method='post', user=user,
+        ),
+        Scenario('tags', '/api/tags/'),
+        Scenario('tags/{id}', f'/api/tags/{tag.id if tag else 0}/'),
+        Scenario('ingredients', '/api/ingredients/'),
+        Scenario('ingredients?name', '/api/ingredients/?name=сах'),
+        Scenario('recipes (anonymous)', '/api/recipes/'),
+        Scenario('recipes/{id}', f'/api/recipes/{recipe.id}/', user=user),
+        Scenario(
+            'recipes/{id} update', f'/api/recipes/{recipe.id}/',
+            method='patch', data=update, user=recipe.author,
+        ),
+        Scenario(
+            'recipes/{id}/favorite', f'/api/recipes/{other.id}/favorite/',
+            method='post', user=user,
+        ),
+        Scenario(
+            'recipes/{id}/shopping_cart',
+            f'/api/recipes/{other.id}/shopping_cart/',
+            method='post', user=user,
+        ),
+        Scenario(
+            'download_shopping_cart',
+            '/api/recipes/download_shopping_cart/', user=user,
+        ),
+        Scenario('recipes/feed', '/api/recipes/feed/', user=user),
+        Scenario(
+            'recipes/favorite (bulk)', '/api/recipes/favorite/',
+            method='post', data=week_menu, user=user,
+        ),
+        Scenario(
+            'recipes/shopping_cart (bulk)', '/api/recipes/shopping_cart/',
+            method='post', data=week_menu, user=user,
+        ),
+        Scenario(
+            'users/subscribe (bulk)', '/api/users/subscribe/',
+            method='post', data=authors, user=user,
+        ),
+    ]
+
+
+def all_scenarios():
+    return (
+        route_scenarios() + recipe_filter_scenarios()
+        + recipe_create_scenarios()
+    )
+
+
+def seed_dataset(users=2000, recipes=20000, seed=1, log=None):
+    """
+    Заполняет пустую базу данными для бенчмарка.
+
+    Ингредиенты берутся из data/ingredients.json, остальное
+    генерируется детерминированно по seed.
+    """
+    generate(users, recipes, seed=seed, log=log)
+
+
+def dataset_size():
+    return {
+        'recipes': Recipe.objects.count(),
+        'users': User.objects.count(),
+        'favorites': FavoriteRecipe.objects.count(),
+    }
+
+
+def load_baseline(path):
+    with open(path, encoding='utf-8') as file:
+        return json.load(file)
+
+
+def save_baseline(path, results):
+    with open(path, 'w', encoding='utf-8') as file:
+        json.dump(results, file, ensure_ascii=False, indent=2, sort_keys=True)
+
+
+def regressions(results, baseline, threshold, noise=1.0):
+    """
+    Сценарии, ставшие хуже базовой линии.
+
+    Рост числа запросов — всегда регрессия, время и память — если
+    выросли больше чем на threshold и больше шума в noise мс.
+    """
+    found = []
+    for name, result in results.items():
+        base = baseline.get(name)
+        if base is None:
+            continue
+        if result['queries'] > base['queries']:
+            found.append(
+                f'{name}: SQL {base["queries"]} -> {result["queries"]}'
+            )
+        for field in ('p50', 'p95'):
+            if (
+                result[field] > base[field] * (1 + threshold)
+                and result[field] - base[field] > noise
+            ):
+                found.append(
+                    f'{name}: {field} {base[field]:.1f} -> '
+                    f'{result[field]:.1f} мс'
+                )
+        if result['memory'] > base.get('memory', 0) * (1 + threshold) + 64:
+            found.append(
+                f'{name}: память {base.get("memory", 0):.0f} -> '
+                f'{result["memory"]:.0f} КБ'
+            )
+    return found
+
+
+LOAD_TEST_PATHS = (
+    '/api/recipes/',
+    '/api/recipes/?limit=20',
+    '/api/tags/',
+    '/api/ingredients/?name=сол',
+)
+
+
+def load_test(base_url, paths, concurrency, total, timeout=30):
+    """
+    Нагрузка на запущенный сервер: одновременно concurrency клиентов,
+    всего total запросов по кругу из paths.
+    """
+    sessions = local()
+
+    def fetch(number):
+        if not hasattr(sessions, 'session'):
+            sessions.session = requests.Session()
+        started = time.perf_counter()
+        try:
+            response = sessions.session.get(
+                base_url + paths[number % len(paths)], timeout=timeout
+            )
+            ok = response.status_code < 500
+        except requests.RequestException:
+            ok = False
+        return ok, time.perf_counter() - started
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(fetch, range(total)))
+    elapsed = time.perf_counter() - started
+    timings = [timing for _, timing in results]
+    return {
+        'rps': total / elapsed,
+        'errors': sum(1 for ok, _ in results if not ok),
+        'p50': percentile(timings, 0.5) * 1000,
+        'p95': percentile(timings, 0.95) * 1000,
+    }
@@ -0,0 +1,120 @@
+from functools import partial
+
+from django.db import connection, transaction
+from django.db.models import Exists, OuterRef
+
+from api.user_state import invalidate_user_state
+from recipes import feed
+from recipes.models import FavoriteRecipe, Recipe, ShoppingCart
+from recipes.signals import change_counters
+from users.models import Follow, User
+
+CREATED = 'created'
+EXISTS = 'exists'
+DELETED = 'deleted'
+NOT_FOUND = 'not_found'
+INVALID = 'invalid'
+
+
+class BulkRelation:
+    """
+    Пакетное добавление и удаление связей пользователя с рецептами
+    или авторами.
+
+    bulk_create и удаление одним DELETE не вызывают сигналы, поэтому
+    счётчики, состояние пользователя и ленты обновляются здесь.
+    """
+
+    def __init__(self, model, field, target, state, counter=None):
+        self.model = model
+        self.field = field
+        self.target = target
+        self.state = state
+        self.counter = counter
+
+    def allowed(self, user, pk):
+        return True
+
+    def add(self, user, ids):
+        linked = dict(self.target.objects.filter(pk__in=ids).annotate(
+            linked=Exists(self.model.objects.filter(
+                user=user, **{self.field: OuterRef('pk')}
+            ))
+        ).values_list('pk', 'linked'))
+        statuses = {}
+        for pk in ids:
+            if pk not in linked:
+                statuses[pk] = NOT_FOUND
+            elif not self.allowed(user, pk):
+                statuses[pk] = INVALID
+            else:
+                statuses[pk] = EXISTS if linked[pk] else CREATED
+        created = [pk for pk, status in statuses.items() if status == CREATED]
+        if created:
+            self.model.objects.bulk_create(
+                (self.model(user=user, **{self.field: pk}) for pk in created),
+                ignore_conflicts=True,
+            )
+            self.changed(user, created, 1)
+        return statuses
+
+    def delete(self, user, ids):
+        deleted = list(self.model.objects.filter(
+            user=user, **{f'{self.field}__in': ids}
+        ).select_for_update().values_list(self.field, flat=True))
+        if deleted:
+            self.delete_rows(user, deleted)
+            self.changed(user, deleted, -1)
+        return {pk: DELETED if pk in deleted else NOT_FOUND for pk in ids}
+
+    def delete_rows(self, user, pks):
+        """Одним DELETE без выборки строк и сигналов на каждую."""
+        meta = self.model._meta
+        quote = connection.ops.quote_name
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {quote(meta.db_table)} '
+                f'WHERE {quote(meta.get_field("user").column)} = %s '
+                f'AND {quote(meta.get_field(self.field).column)} '
+                f'IN ({", ".join(["%s"] * len(pks))})',
+                [user.pk, *pks],
+            )
+
+    def changed(self, user, pks, delta):
+        if self.counter:
+            change_counters(self.target, pks, self.counter, delta)
+        invalidate_user_state(user.id, self.state)
+
+    @transaction.atomic
+    def apply(self, method, user, ids):
+        """Статус каждого id в порядке запроса."""
+        ids = list(dict.fromkeys(ids))
+        if method == 'DELETE':
+            statuses = self.delete(user, ids)
+        else:
+            statuses = self.add(user, ids)
+        return [{'id': pk, 'status': statuses[pk]} for pk in ids]
+
+
+class BulkFollow(BulkRelation):
+
+    def allowed(self, user, pk):
+        return pk != user.pk
+
+    def changed(self, user, pks, delta):
+        super().changed(user, pks, delta)
+        if delta > 0:
+            transaction.on_commit(partial(feed.backfill, user.id, pks))
+        else:
+            feed.remove(user.id, pks)
+
+
+favorites = BulkRelation(
+    FavoriteRecipe, 'recipe_id', Recipe, 'favorites', 'favorites_count'
+)
+shopping_cart = BulkRelation(
+    ShoppingCart, 'recipe_id', Recipe, 'shopping_cart'
+)
+subscriptions = BulkFollow(
+    Follow, 'author_id', User, 'following', 'followers_count'
+)
@@ -0,0 +1,278 @@
+import hashlib
+import json
+import time
+from collections import OrderedDict
+from functools import wraps
+from threading import Lock
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
+from rest_framework import status
+from rest_framework.response import Response
+
+from recipes.models import Recipe
+
+
+class LocalCache:
+    """Кэш в памяти процесса с ограничением размера и временем жизни."""
+
+    def __init__(self, maxsize, timeout):
+        self.maxsize = maxsize
+        self.timeout = timeout
+        self._data = OrderedDict()
+        self._lock = Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            expires, value = item
+            if expires < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.timeout, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+ingredient_search_cache = LocalCache(
+    maxsize=settings.INGREDIENT_SEARCH_CACHE_SIZE,
+    timeout=settings.INGREDIENT_SEARCH_CACHE_TIMEOUT,
+)
+
+
+def catalog_version(name):
+    """
+    Время последнего изменения справочника, оно же его версия.
+
+    Версия хранится бессрочно: иначе ETag и Last-Modified менялись бы
+    без изменения данных.
+    """
+    key = f'catalog:{name}:version'
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, time.time(), None)
+        return cache.get(key, time.time())
+    return version
+
+
+def catalog_versions(names):
+    """Версии нескольких справочников одним обращением к кэшу."""
+    keys = {f'catalog:{name}:version': name for name in names}
+    versions = {
+        keys[key]: version
+        for key, version in cache.get_many(list(keys)).items()
+    }
+    for name in names:
+        if name not in versions:
+            versions[name] = catalog_version(name)
+    return versions
+
+
+def bump_catalog_version(name):
+    cache.set(f'catalog:{name}:version', time.time(), None)
+
+
+def invalidate_ingredients():
+    bump_catalog_version('ingredients')
+    ingredient_search_cache.clear()
+
+
+def invalidate_all():
+    """
+    Сбрасывает все кэши ответов приложения сменой версий.
+
+    В отличие от cache.clear() не трогает чужие ключи общего кэша.
+    """
+    bump_catalog_version('tags')
+    bump_catalog_version('recipes')
+    invalidate_ingredients()
+
+
+def catalog_snapshot(name, build):
+    """Сериализованный справочник из кэша для текущей версии."""
+    key = f'catalog:{name}:{catalog_version(name)}'
+    data = cache.get(key)
+    if data is None:
+        data = build().data
+        cache.set(key, data, settings.CATALOG_CACHE_TIMEOUT)
+    return data
+
+
+def conditional_catalog(name):
+    """
+    ETag и Last-Modified по версии справочника, ответ 304 без запроса к БД.
+    """
+    def decorator(method):
+        @wraps(method)
+        def wrapper(view, request, *args, **kwargs):
+            version = catalog_version(name)
+            etag = quote_etag(f'{name}-{version:.6f}')
+            last_modified = int(version)
+            response = get_conditional_response(
+                request, etag=etag, last_modified=last_modified
+            )
+            if response is None:
+                response = method(view, request, *args, **kwargs)
+            response['ETag'] = etag
+            response['Last-Modified'] = http_date(last_modified)
+            patch_cache_control(response, no_cache=True)
+            return response
+        return wrapper
+    return decorator
+
+
+RECIPE_CACHE_PARAMS = ('page', 'limit', 'tags', 'author', 'ordering')
+CACHE_METRICS = ('recipes',)
+
+
+def count_cache_result(name, hit):
+    key = f'metrics:cache:{name}:{"hits" if hit else "misses"}'
+    cache.add(key, 0, None)
+    try:
+        cache.incr(key)
+    except ValueError:
+        # Счётчик вытеснен из кэша между add и incr.
+        cache.set(key, 1, None)
+
+
+def cache_metrics():
+    """Попадания и промахи кэшей ответов: {имя: (hits, misses)}."""
+    counters = cache.get_many([
+        f'metrics:cache:{name}:{kind}'
+        for name in CACHE_METRICS for kind in ('hits', 'misses')
+    ])
+    return {
+        name: tuple(
+            counters.get(f'metrics:cache:{name}:{kind}', 0)
+            for kind in ('hits', 'misses')
+        )
+        for name in CACHE_METRICS
+    }
+
+
+def recipe_cache_scopes(request, kwargs):
+    """
+    Области, от которых зависит ответ, и нормализованные параметры.
+
+    None, если запрос нельзя кэшировать.
+    """
+    params = request.query_params
+    if request.user.is_authenticated or set(params) - set(
+        RECIPE_CACHE_PARAMS
+    ):
+        return None
+    if 'pk' in kwargs:
+        return [f'recipe:{kwargs["pk"]}'], {'pk': str(kwargs['pk'])}
+    normalized = {
+        name: sorted(set(params.getlist(name)))
+        for name in RECIPE_CACHE_PARAMS if name in params
+    }
+    scopes = [f'author:{author}' for author in normalized.get('author', ())]
+    scopes += [f'tag:{slug}' for slug in normalized.get('tags', ())]
+    scopes = scopes or ['all']
+    if 'ordering' in normalized:
+        # Порядок меняется при каждом пересчёте популярности.
+        scopes.append('popular')
+    return scopes, normalized
+
+
+def cache_anonymous_recipes(method):
+    """
+    Кэш ответов анонимным пользователям с версиями по рецепту,
+    автору и тегу: изменение рецепта сбрасывает только зависящие
+    от него ответы.
+    """
+    @wraps(method)
+    def wrapper(view, request, *args, **kwargs):
+        cacheable = recipe_cache_scopes(request, kwargs)
+        if cacheable is None:
+            return method(view, request, *args, **kwargs)
+        scopes, params = cacheable
+        # recipes — версия всех ответов, её меняет invalidate_all.
+        names = ['tags', 'ingredients', 'recipes'] + [
+            f'recipes:{scope}' for scope in scopes
+        ]
+        key_data = json.dumps(
+            [request.get_host(), view.action, params,
+             sorted(catalog_versions(names).items())],
+            sort_keys=True,
+        )
+        key = f'recipes:{hashlib.md5(key_data.encode()).hexdigest()}'
+        data = cache.get(key)
+        count_cache_result('recipes', data is not None)
+        if data is not None:
+            response = Response(data)
+            response['X-Cache'] = 'HIT'
+            return response
+        response = method(view, request, *args, **kwargs)
+        if response.status_code == status.HTTP_200_OK:
+            cache.set(key, response.data, settings.RECIPE_CACHE_TIMEOUT)
+        response['X-Cache'] = 'MISS'
+        return response
+    return wrapper
+
+
+def invalidate_recipes(recipe_ids, scopes=()):
+    """
+    Сбрасывает кэш ответов по рецептам после коммита транзакции.
+
+    Все изменения одной транзакции сбрасываются одним вызовом,
+    автор и теги рецептов читаются уже после коммита.
+    """
+    connection = transaction.get_connection()
+    pending = getattr(connection, 'pending_recipe_invalidation', None)
+    # После отката транзакции flush уже не вызовется. Связанные методы
+    # не тождественны друг другу, поэтому сравнивается их объект.
+    if pending is None or not any(
+        getattr(func, '__self__', None) is pending
+        for _, func in connection.run_on_commit
+    ):
+        pending = PendingInvalidation(connection)
+    pending.recipe_ids.update(recipe_ids)
+    pending.scopes.update(scopes)
+    if not pending.registered:
+        pending.registered = True
+        transaction.on_commit(pending.flush)
+
+
+class PendingInvalidation:
+    """Рецепты и области, накопленные за транзакцию."""
+
+    def __init__(self, connection):
+        self.connection = connection
+        self.recipe_ids = set()
+        self.scopes = {'all'}
+        self.registered = False
+        connection.pending_recipe_invalidation = self
+
+    def flush(self):
+        self.connection.pending_recipe_invalidation = None
+        scopes = set(self.scopes)
+        scopes.update(f'recipe:{pk}' for pk in self.recipe_ids)
+        scopes.update(
+            f'author:{author_id}' for author_id in Recipe.objects.filter(
+                pk__in=self.recipe_ids
+            ).values_list('author_id', flat=True)
+        )
+        scopes.update(
+            f'tag:{slug}' for slug in Recipe.tags.through.objects.filter(
+                recipe_id__in=self.recipe_ids
+            ).values_list('tag__slug', flat=True)
+        )
+        for scope in scopes:
+            bump_catalog_version(f'recipes:{scope}')
@@ -1,43 +1,120 @@
+from django.conf import settings
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from django.db import connections
+from django.db.models import (Case, Exists, F, IntegerField, OuterRef, Q,
+                              Value, When)
+from django.db.models.functions import Lower, Replace
 from django_filters import rest_framework
-from rest_framework.filters import SearchFilter
+from rest_framework.filters import BaseFilterBackend
 
-from recipes.models import Recipe
+from recipes.models import FavoriteRecipe, Recipe, ShoppingCart
 from tag.models import Tag
 from users.models import User
 
 
-class NameFilter(SearchFilter):
-    """Фильтр по имени."""
+def normalize_name(value):
+    return value.strip().lower().replace('ё', 'е')
+
+
+class NameFilter(BaseFilterBackend):
+    """
+    Фильтр по имени без учёта регистра и буквы «ё».
+
+    Сначала идут совпадения по началу названия, затем по вхождению.
+    Выражение совпадает с индексами из миграции recipes 0005.
+    Число результатов ограничивает IngredientViewSet.list: фильтр
+    работает и для retrieve, где срез сломал бы get().
+    """
 
     search_param = 'name'
 
+    def filter_queryset(self, request, queryset, view):
+        name = normalize_name(request.query_params.get(self.search_param, ''))
+        if not name:
+            return queryset
+        return queryset.annotate(
+            normalized_name=Replace(Lower('name'), Value('ё'), Value('е'))
+        ).filter(
+            normalized_name__contains=name
+        ).annotate(
+            rank=Case(
+                When(normalized_name__startswith=name, then=Value(0)),
+                default=Value(1),
+                output_field=IntegerField(),
+            )
+        ).order_by(
+            'rank', 'normalized_name', 'measurement_unit'
+        )
+
 
 class RecipeFilter(rest_framework.FilterSet):
-    """Фильтр по автору, тэгам, избранному, списку покупок."""
+    """
+    Фильтр по автору, тэгам, избранному, списку покупок.
+
+    Связанные таблицы проверяются подзапросами EXISTS: соединения не
+    размножают строки рецептов, и DISTINCT не нужен.
+    """
 
     author = rest_framework.ModelChoiceFilter(queryset=User.objects.all())
     tags = rest_framework.ModelMultipleChoiceFilter(
         field_name='tags__slug',
         queryset=Tag.objects.all(),
         to_field_name='slug',
+        method='get_tags',
     )
     is_favorited = rest_framework.BooleanFilter(method='get_is_favorited')
     is_in_shopping_cart = rest_framework.BooleanFilter(
         method="get_is_in_shopping_cart"
     )
+    search = rest_framework.CharFilter(method='get_search')
+    ordering = rest_framework.ChoiceFilter(
+        choices=(('popular', 'Популярные'),),
+        method='get_ordering',
+    )
 
     class Meta:
         model = Recipe
-        fields = ('tags', 'author', 'is_favorited', 'is_in_shopping_cart')
+        fields = (
+            'tags', 'author', 'is_favorited', 'is_in_shopping_cart', 'search',
+            'ordering',
+        )
 
-    def get_is_favorited(self, queryset, name, value):
+    def get_tags(self, queryset, name, value):
+        if not value:
+            return queryset
+        return queryset.filter(Exists(Recipe.tags.through.objects.filter(
+            recipe_id=OuterRef('pk'), tag__in=value
+        )))
+
+    def filter_by_user(self, queryset, model, value):
         user = self.request.user
-        if value:
-            return queryset.filter(favorites__user=user)
-        return Recipe.objects.all()
+        if not value:
+            return queryset
+        if user.is_anonymous:
+            return queryset.none()
+        return queryset.filter(Exists(model.objects.filter(
+            user=user, recipe=OuterRef('pk')
+        )))
+
+    def get_is_favorited(self, queryset, name, value):
+        return self.filter_by_user(queryset, FavoriteRecipe, value)
 
     def get_is_in_shopping_cart(self, queryset, name, value):
-        user = self.request.user
-        if value:
-            return queryset.filter(shopping_cart__user=user)
-        return Recipe.objects.all()
+        return self.filter_by_user(queryset, ShoppingCart, value)
+
+    def get_search(self, queryset, name, value):
+        """Полнотекстовый поиск с сортировкой по релевантности."""
+        if connections[queryset.db].vendor != 'postgresql':
+            return queryset.filter(
+                Q(name__icontains=value) | Q(text__icontains=value)
+            )
+        query = SearchQuery(
+            value, config=settings.SEARCH_CONFIG, search_type='websearch'
+        )
+        return queryset.filter(search_vector=query).annotate(
+            rank=SearchRank(F('search_vector'), query)
+        ).order_by('-rank', '-pub_date', '-id')
+
+    def get_ordering(self, queryset, name, value):
+        """Порядок по заранее посчитанной популярности."""
+        return queryset.by_popularity()
@@ -0,0 +1,322 @@
+import json
+import random
+from bisect import bisect
+from datetime import timedelta
+from io import StringIO
+from itertools import accumulate
+from multiprocessing import Pool
+
+from django.contrib.auth.hashers import make_password
+from django.core.management import call_command
+from django.core.management.color import no_style
+from django.db import connection, connections, transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from api.cache import invalidate_all
+from recipes.models import (FavoriteRecipe, Ingredient, Recipe,
+                            RecipeIngredient, ShoppingCart)
+from tag.models import Tag
+from users.models import Follow, User
+
+TAGS = (
+    ('Завтрак', '#E26C2D', 'breakfast'),
+    ('Обед', '#49B64E', 'lunch'),
+    ('Ужин', '#8775D2', 'dinner'),
+    ('Выпечка', '#F2C94C', 'baking'),
+    ('Десерт', '#EB5757', 'dessert'),
+    ('Суп', '#2F80ED', 'soup'),
+    ('Салат', '#27AE60', 'salad'),
+    ('Напиток', '#9B51E0', 'drink'),
+)
+WORDS = (
+    'быстрый', 'домашний', 'пряный', 'лёгкий', 'сытный', 'летний',
+    'праздничный', 'бабушкин', 'острый', 'нежный', 'постный', 'пышный',
+)
+DISHES = (
+    'пирог', 'суп', 'салат', 'рагу', 'омлет', 'плов', 'борщ', 'кекс',
+    'гуляш', 'соус', 'паштет', 'смузи', 'запеканка', 'каша', 'пудинг',
+)
+USER_FIELDS = (
+    'id', 'email', 'username', 'first_name', 'last_name', 'password',
+    'is_superuser', 'is_staff', 'is_active', 'date_joined',
+    'recipes_count', 'followers_count',
+)
+RECIPE_FIELDS = (
+    'id', 'author_id', 'name', 'text', 'image', 'cooking_time',
+    'pub_date', 'favorites_count', 'image_renditions',
+)
+
+# Разброс дат публикации рецептов, секунд.
+MAX_AGE = 3 * 365 * 24 * 3600
+
+# Данные для рабочих процессов, задаются в init_worker.
+plan = None
+
+
+class Skewed:
+    """
+    Выбор с перекосом по закону Ципфа: первый элемент популярнее
+    второго в 2**skew раз и так далее.
+    """
+
+    def __init__(self, items, skew):
+        self.items = items
+        self.weights = list(accumulate(
+            1 / rank ** skew for rank in range(1, len(items) + 1)
+        ))
+
+    def choice(self, generator):
+        point = generator.random() * self.weights[-1]
+        return self.items[bisect(self.weights, point)]
+
+    def sample(self, generator, size, exclude=None):
+        """До size разных элементов; для маленьких size, как здесь."""
+        size = min(size, len(self.items) - (exclude is not None))
+        chosen = set()
+        for _ in range(size * 20):
+            if len(chosen) >= size:
+                break
+            item = self.choice(generator)
+            if item != exclude:
+                chosen.add(item)
+        return chosen
+
+
+class Plan:
+    """Параметры генерации, общие для всех рабочих процессов."""
+
+    def __init__(self, seed, skew, user_ids, recipe_ids, ingredient_ids,
+                 tag_ids, now, password, per_user):
+        self.seed = seed
+        self.now = now
+        self.password = password
+        self.per_user = per_user
+        self.authors = Skewed(user_ids, skew)
+        self.recipes = Skewed(recipe_ids, skew)
+        self.ingredients = Skewed(ingredient_ids, skew / 2)
+        self.tags = Skewed(tag_ids, skew)
+
+    def random(self, kind, chunk):
+        return random.Random(f'{self.seed}:{kind}:{chunk}')
+
+
+def copy_value(value):
+    if value is None:
+        return '\\N'
+    if isinstance(value, bool):
+        return 't' if value else 'f'
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    if isinstance(value, (dict, list)):
+        value = json.dumps(value)
+    return (
+        str(value).replace('\\', '\\\\').replace('\t', '\\t')
+        .replace('\n', '\\n').replace('\r', '\\r')
+    )
+
+
+def write_rows(model, fields, rows):
+    """
+    Запись строк: COPY в PostgreSQL, bulk_create в остальных БД.
+
+    bulk_create перезаписывает поля auto_now_add текущим временем.
+    """
+    rows = list(rows)
+    if not rows:
+        return 0
+    if connection.vendor == 'postgresql':
+        buffer = StringIO()
+        for row in rows:
+            buffer.write('\t'.join(copy_value(value) for value in row))
+            buffer.write('\n')
+        buffer.seek(0)
+        columns = [model._meta.get_field(field).column for field in fields]
+        with connection.cursor() as cursor:
+            cursor.copy_from(buffer, model._meta.db_table, columns=columns)
+    else:
+        model.objects.bulk_create(
+            (model(**dict(zip(fields, row))) for row in rows),
+            batch_size=1000,
+        )
+    return len(rows)
+
+
+def init_worker(worker_plan):
+    global plan
+    plan = worker_plan
+
+
+def users_chunk(chunk):
+    number, start, end = chunk
+    rows = (
+        (
+            pk, f'user{pk}@foodgram.local', f'user{pk}', 'Имя',
+            f'Фамилия {pk}', plan.password, False, False, True,
+            plan.now, 0, 0,
+        )
+        for pk in range(start, end)
+    )
+    with transaction.atomic():
+        return write_rows(User, USER_FIELDS, rows)
+
+
+def recipes_chunk(chunk):
+    number, start, end = chunk
+    generator = plan.random('recipes', number)
+    recipes, ingredients, tags = [], [], []
+    for pk in range(start, end):
+        recipes.append((
+            pk, plan.authors.choice(generator),
+            f'{generator.choice(WORDS).capitalize()} '
+            f'{generator.choice(DISHES)} №{pk}',
+            f'{generator.choice(WORDS).capitalize()} рецепт: смешать, '
+            f'приготовить и подать. {generator.choice(DISHES)}.',
+            'recipes/benchmark.png', generator.randint(5, 180),
+            plan.now - timedelta(seconds=generator.randint(0, MAX_AGE)),
+            0, {},
+        ))
+        for ingredient_id in plan.ingredients.sample(
+            generator, generator.randint(3, 12)
+        ):
+            ingredients.append((pk, ingredient_id, generator.randint(1, 500)))
+        for tag_id in plan.tags.sample(generator, generator.randint(1, 3)):
+            tags.append((pk, tag_id))
+    with transaction.atomic():
+        total = write_rows(Recipe, RECIPE_FIELDS, recipes)
+        total += write_rows(
+            RecipeIngredient, ('recipe_id', 'ingredient_id', 'amount'),
+            ingredients,
+        )
+        total += write_rows(
+            Recipe.tags.through, ('recipe_id', 'tag_id'), tags
+        )
+    return total
+
+
+def relations_chunk(chunk):
+    """Подписки, избранное и корзины пользователей из диапазона."""
+    number, start, end = chunk
+    generator = plan.random('relations', number)
+    rows = {Follow: [], FavoriteRecipe: [], ShoppingCart: []}
+    for user_id in range(start, end):
+        for model, source in (
+            (Follow, plan.authors),
+            (FavoriteRecipe, plan.recipes),
+            (ShoppingCart, plan.recipes),
+        ):
+            average = plan.per_user[model]
+            size = generator.randint(0, 2 * average)
+            if model is Follow:
+                rows[model] += [
+                    (user_id, target)
+                    for target in source.sample(generator, size, user_id)
+                ]
+                continue
+            rows[model] += [
+                (user_id, target, plan.now - timedelta(
+                    seconds=generator.randint(0, MAX_AGE)
+                ))
+                for target in source.sample(generator, size)
+            ]
+    total = 0
+    with transaction.atomic():
+        for model, fields in (
+            (Follow, ('user_id', 'author_id')),
+            (FavoriteRecipe, ('user_id', 'recipe_id', 'created')),
+            (ShoppingCart, ('user_id', 'recipe_id', 'created')),
+        ):
+            total += write_rows(model, fields, rows[model])
+    return total
+
+
+def chunks(start, end, size):
+    return [
+        (number, chunk_start, min(chunk_start + size, end))
+        for number, chunk_start in enumerate(range(start, end, size))
+    ]
+
+
+def next_id(model):
+    return (model.objects.aggregate(last=Max('id'))['last'] or 0) + 1
+
+
+def run(task, tasks, worker_plan, workers, log, title):
+    done = 0
+    if workers > 1:
+        # Соединения родителя нельзя наследовать в дочерних процессах.
+        connections.close_all()
+        with Pool(workers, init_worker, (worker_plan,)) as pool:
+            for rows in pool.imap_unordered(task, tasks):
+                done += rows
+                log(f'{title}: {done} строк')
+    else:
+        init_worker(worker_plan)
+        for chunk in tasks:
+            done += task(chunk)
+            log(f'{title}: {done} строк')
+    return done
+
+
+def generate(users, recipes, follows=10, favorites=20, shopping_cart=5,
+             workers=1, batch_size=10000, seed=1, skew=1.1, log=None):
+    """
+    Генерирует пользователей, рецепты и связи между ними.
+
+    Результат детерминирован для одинаковых seed, размеров и исходной
+    базы: каждый кусок данных получает свой генератор случайных чисел,
+    независимо от того, какой процесс его обработает.
+    """
+    log = log or (lambda message: None)
+    if connection.vendor == 'sqlite':
+        # SQLite блокирует базу на запись целиком.
+        workers = 1
+    if not Ingredient.objects.exists():
+        call_command('import_date', verbosity=0)
+    for name, color, slug in TAGS:
+        Tag.objects.get_or_create(
+            slug=slug, defaults={'name': name, 'color': color}
+        )
+    now = timezone.now()
+    user_start, recipe_start = next_id(User), next_id(Recipe)
+    worker_plan = Plan(
+        seed, skew, [], [],
+        list(Ingredient.objects.values_list('id', flat=True)),
+        list(Tag.objects.values_list('id', flat=True)),
+        now, make_password(f'password-{seed}'),
+        {Follow: follows, FavoriteRecipe: favorites,
+         ShoppingCart: shopping_cart},
+    )
+    run(
+        users_chunk, chunks(user_start, user_start + users, batch_size),
+        worker_plan, workers, log, 'Пользователи',
+    )
+    worker_plan.authors = Skewed(
+        list(User.objects.order_by('id').values_list('id', flat=True)), skew
+    )
+    run(
+        recipes_chunk,
+        chunks(recipe_start, recipe_start + recipes, batch_size // 10 or 1),
+        worker_plan, workers, log, 'Рецепты с ингредиентами и тегами',
+    )
+    worker_plan.recipes = Skewed(
+        list(Recipe.objects.order_by('id').values_list('id', flat=True)), skew
+    )
+    run(
+        relations_chunk,
+        chunks(user_start, user_start + users, batch_size // 20 or 1),
+        worker_plan, workers, log, 'Подписки, избранное и корзины',
+    )
+    with connection.cursor() as cursor:
+        for sql in connection.ops.sequence_reset_sql(
+            no_style(), [User, Recipe]
+        ):
+            cursor.execute(sql)
+        if connection.vendor == 'postgresql':
+            cursor.execute('ANALYZE')
+    call_command('recount_counters', verbosity=0)
+    call_command('refresh_popularity', full=True, verbosity=0)
+    call_command('rebuild_feed', verbosity=0)
+    Recipe.objects.update_search_vector()
+    # Данные записаны в обход сигналов, кэш ответов устарел.
+    invalidate_all()
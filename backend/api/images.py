@@ -0,0 +1,178 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from io import BytesIO
+from threading import BoundedSemaphore
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import connection, transaction
+from drf_extra_fields.fields import Base64ImageField
+from PIL import Image, ImageOps, features
+from rest_framework import serializers
+
+from recipes.storage import recipe_storage
+
+logger = logging.getLogger(__name__)
+
+# Image.Resampling появился в Pillow 9.1, Image.LANCZOS удалён в 10.
+LANCZOS = getattr(Image, 'Resampling', Image).LANCZOS
+
+executor = ThreadPoolExecutor(
+    max_workers=settings.IMAGE_WORKERS,
+    thread_name_prefix='images',
+)
+# Ограничивает и выполняемые, и ожидающие задачи: очередь
+# ThreadPoolExecutor сама по себе не ограничена.
+slots = BoundedSemaphore(settings.IMAGE_WORKERS * 2)
+
+
+def run_in_pool(function, *args):
+    if not slots.acquire(timeout=settings.IMAGE_PROCESSING_TIMEOUT):
+        raise serializers.ValidationError(
+            'Сервер занят обработкой изображений, повторите запрос позже'
+        )
+    try:
+        future = executor.submit(function, *args)
+    except RuntimeError:
+        slots.release()
+        raise
+    future.add_done_callback(lambda _: slots.release())
+    try:
+        return future.result(timeout=settings.IMAGE_PROCESSING_TIMEOUT)
+    except FutureTimeoutError:
+        raise serializers.ValidationError(
+            'Не удалось обработать изображение'
+        )
+
+
+class RecipeImageField(Base64ImageField):
+    """
+    Картинка в base64: декодирование и проверка идут в пуле потоков.
+    """
+
+    def to_internal_value(self, base64_data):
+        if (
+            isinstance(base64_data, str)
+            and len(base64_data) * 3 // 4 > settings.IMAGE_MAX_SIZE
+        ):
+            raise serializers.ValidationError(
+                'Размер изображения не должен превышать '
+                f'{settings.IMAGE_MAX_SIZE // 1024 // 1024} МБ'
+            )
+        return run_in_pool(super().to_internal_value, base64_data)
+
+
+class RecipeImageRenditionField(serializers.Field):
+    """
+    Ссылка на уменьшенную копию картинки рецепта.
+
+    Если копии ещё нет, отдаётся исходная картинка.
+    """
+
+    list_actions = ('list', 'feed')
+
+    def __init__(self, rendition, list_rendition=None, **kwargs):
+        self.rendition = rendition
+        self.list_rendition = list_rendition or rendition
+        kwargs['source'] = '*'
+        kwargs['read_only'] = True
+        super().__init__(**kwargs)
+
+    def to_representation(self, recipe):
+        rendition = self.rendition
+        view = self.context.get('view')
+        if getattr(view, 'action', None) in self.list_actions:
+            rendition = self.list_rendition
+        name = (recipe.image_renditions or {}).get(rendition)
+        if name:
+            url = recipe_storage.url(name)
+        elif recipe.image:
+            url = recipe.image.url
+        else:
+            return None
+        request = self.context.get('request')
+        if request is not None:
+            return request.build_absolute_uri(url)
+        return url
+
+
+def image_format():
+    return 'WEBP' if features.check('webp') else 'JPEG'
+
+
+def render(image, size, image_format):
+    copy = image.copy()
+    copy.thumbnail(size, LANCZOS)
+    if image_format == 'JPEG' and copy.mode != 'RGB':
+        copy = copy.convert('RGB')
+    buffer = BytesIO()
+    copy.save(
+        buffer, image_format, quality=settings.IMAGE_RENDITION_QUALITY
+    )
+    return buffer.getvalue()
+
+
+def save_rendition(image, name, size, image_format):
+    extension = 'webp' if image_format == 'WEBP' else 'jpg'
+    return recipe_storage.save(
+        f'recipes/renditions/{name}.{extension}',
+        ContentFile(render(image, size, image_format)),
+    )
+
+
+def make_renditions(image_file):
+    """Уменьшенные копии картинки, имена задаёт хранилище по содержимому."""
+    image_file.open('rb')
+    try:
+        image = ImageOps.exif_transpose(Image.open(image_file))
+        image.load()
+    finally:
+        image_file.close()
+    if image.mode not in ('RGB', 'RGBA'):
+        image = image.convert('RGBA' if 'A' in image.getbands() else 'RGB')
+    target = image_format()
+    return {
+        name: save_rendition(image, name, size, target)
+        for name, size in settings.IMAGE_RENDITIONS.items()
+    }
+
+
+def update_renditions(recipe_id):
+    """
+    Создаёт копии картинки рецепта и сохраняет их имена.
+
+    Если картинку успели заменить, результат отбрасывается.
+    """
+    from recipes.models import Recipe
+
+    try:
+        recipe = Recipe.objects.only('image').get(pk=recipe_id)
+        if not recipe.image:
+            return
+        renditions = make_renditions(recipe.image)
+        Recipe.objects.filter(pk=recipe_id, image=recipe.image.name).update(
+            image_renditions=renditions
+        )
+    except Exception:
+        logger.exception('Не удалось создать копии картинки рецепта %s',
+                         recipe_id)
+    finally:
+        connection.close()
+
+
+def schedule_renditions(recipe):
+    """
+    Ставит создание копий картинки в очередь после коммита транзакции.
+
+    При переполненной очереди копии создаст команда generate_renditions,
+    а до тех пор отдаётся исходная картинка.
+    """
+    def submit():
+        if not slots.acquire(blocking=False):
+            logger.warning('Очередь обработки картинок переполнена')
+            return
+        future = executor.submit(update_renditions, recipe.pk)
+        future.add_done_callback(lambda _: slots.release())
+
+    transaction.on_commit(submit)
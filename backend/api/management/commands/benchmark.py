@@ -0,0 +1,97 @@
+from django.core.management import BaseCommand, CommandError
+
+from api.benchmarks import (all_scenarios, dataset_size, load_baseline,
+                            measure, regressions, save_baseline, seed_dataset)
+from recipes.models import Recipe
+
+
+class Command(BaseCommand):
+    '''
+    Замер времени ответа и числа запросов к БД для эндпоинтов API.
+    '''
+
+    help = (
+        'Запускает запросы к API на текущей базе и выводит p50/p95, '
+        'число SQL-запросов и пик памяти; сравнивает с базовой линией'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--repeat', type=int, default=20,
+            help='Сколько раз повторять каждый запрос',
+        )
+        parser.add_argument(
+            '--scenario', default='',
+            help='Запускать только сценарии, содержащие эту строку',
+        )
+        parser.add_argument(
+            '--cold', action='store_true',
+            help='Очищать кэш перед каждым запросом',
+        )
+        parser.add_argument(
+            '--seed', action='store_true',
+            help='Заполнить базу тестовыми данными, если рецептов нет',
+        )
+        parser.add_argument(
+            '--users', type=int, default=2000,
+            help='Пользователей при заполнении базы',
+        )
+        parser.add_argument(
+            '--recipes', type=int, default=20000,
+            help='Рецептов при заполнении базы',
+        )
+        parser.add_argument(
+            '--save-baseline', metavar='PATH',
+            help='Сохранить результаты как базовую линию в JSON',
+        )
+        parser.add_argument(
+            '--baseline', metavar='PATH',
+            help='Сравнить результаты с базовой линией из JSON',
+        )
+        parser.add_argument(
+            '--threshold', type=float, default=0.2,
+            help='Допустимый рост времени и памяти, доля (0.2 = 20%%)',
+        )
+
+    def handle(self, *args, **options):
+        if options['seed'] and not Recipe.objects.exists():
+            seed_dataset(
+                users=options['users'], recipes=options['recipes'],
+                log=self.stdout.write,
+            )
+        sizes = ', '.join(
+            f'{name}: {size}' for name, size in dataset_size().items()
+        )
+        self.stdout.write(f'Данные: {sizes}')
+        self.stdout.write(
+            f'{"сценарий":<32}{"код":>5}{"SQL":>6}'
+            f'{"p50, мс":>10}{"p95, мс":>10}{"память, КБ":>12}'
+        )
+        results = {}
+        for scenario in all_scenarios():
+            if options['scenario'] not in scenario.name:
+                continue
+            result = results[scenario.name] = measure(
+                scenario, options['repeat'], options['cold']
+            )
+            self.stdout.write(
+                f'{scenario.name:<32}{result["status"]:>5}'
+                f'{result["queries"]:>6}'
+                f'{result["p50"]:>10.1f}{result["p95"]:>10.1f}'
+                f'{result["memory"]:>12.0f}'
+            )
+        if options['save_baseline']:
+            save_baseline(options['save_baseline'], results)
+            self.stdout.write(
+                f'Базовая линия сохранена в {options["save_baseline"]}'
+            )
+        if options['baseline']:
+            found = regressions(
+                results, load_baseline(options['baseline']),
+                options['threshold'],
+            )
+            if found:
+                raise CommandError(
+                    'Регрессии производительности:\n' + '\n'.join(found)
+                )
+            self.stdout.write(self.style.SUCCESS('Регрессий нет'))
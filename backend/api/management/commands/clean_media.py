@@ -0,0 +1,67 @@
+import os
+from datetime import timedelta
+
+from django.core.management import BaseCommand
+from django.utils import timezone
+
+from recipes.models import Recipe
+from recipes.storage import recipe_storage
+
+MEDIA_DIRS = ('recipes', 'recipes/renditions')
+
+
+def stored_files(directory):
+    if not recipe_storage.exists(directory):
+        return
+    _, files = recipe_storage.listdir(directory)
+    for name in files:
+        yield os.path.join(directory, name)
+
+
+class Command(BaseCommand):
+    '''
+    Удаление картинок, на которые не ссылается ни один рецепт.
+    '''
+
+    help = (
+        'Удаляет из media/recipes/ файлы, не привязанные к рецептам'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--min-age', type=int, default=24,
+            help=(
+                'Не трогать файлы моложе указанного числа часов: '
+                'они могут принадлежать незавершённым запросам'
+            ),
+        )
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Только показать файлы, которые будут удалены',
+        )
+
+    def handle(self, *args, **options):
+        used = set()
+        for image, renditions in Recipe.objects.values_list(
+            'image', 'image_renditions'
+        ).iterator():
+            used.add(image)
+            used.update((renditions or {}).values())
+        threshold = timezone.now() - timedelta(hours=options['min_age'])
+        removed = size = 0
+        for directory in MEDIA_DIRS:
+            for name in stored_files(directory):
+                if name in used:
+                    continue
+                if recipe_storage.get_modified_time(name) > threshold:
+                    continue
+                size += recipe_storage.size(name)
+                removed += 1
+                if options['dry_run']:
+                    self.stdout.write(name)
+                else:
+                    recipe_storage.delete(name)
+        action = 'Найдено' if options['dry_run'] else 'Удалено'
+        self.stdout.write(self.style.SUCCESS(
+            f'{action} {removed} файлов, {size / 1024 / 1024:.1f} МБ'
+        ))
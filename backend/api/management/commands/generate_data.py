@@ -0,0 +1,74 @@
+import os
+import time
+
+from django.core.management import BaseCommand
+
+from api.generator import generate
+
+
+class Command(BaseCommand):
+    '''
+    Генерация пользователей, рецептов, подписок, избранного и корзин
+    для нагрузочного тестирования.
+    '''
+
+    help = (
+        'Добавляет в базу синтетические данные с перекосом популярности '
+        'авторов, тегов и рецептов; одинаковый --seed даёт одинаковые данные'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--users', type=int, default=100000,
+            help='Сколько пользователей добавить',
+        )
+        parser.add_argument(
+            '--recipes', type=int, default=1000000,
+            help='Сколько рецептов добавить',
+        )
+        parser.add_argument(
+            '--follows', type=int, default=10,
+            help='Подписок на пользователя в среднем',
+        )
+        parser.add_argument(
+            '--favorites', type=int, default=20,
+            help='Рецептов в избранном на пользователя в среднем',
+        )
+        parser.add_argument(
+            '--shopping-cart', type=int, default=5,
+            help='Рецептов в корзине на пользователя в среднем',
+        )
+        parser.add_argument(
+            '--workers', type=int, default=os.cpu_count() or 1,
+            help='Число процессов; для SQLite всегда 1',
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=10000,
+            help='Примерное число строк в одной транзакции записи',
+        )
+        parser.add_argument(
+            '--seed', type=int, default=1,
+            help='Начальное значение генератора случайных чисел',
+        )
+        parser.add_argument(
+            '--skew', type=float, default=1.1,
+            help='Показатель распределения Ципфа; 0 — без перекоса',
+        )
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        generate(
+            users=options['users'],
+            recipes=options['recipes'],
+            follows=options['follows'],
+            favorites=options['favorites'],
+            shopping_cart=options['shopping_cart'],
+            workers=options['workers'],
+            batch_size=options['batch_size'],
+            seed=options['seed'],
+            skew=options['skew'],
+            log=self.stdout.write,
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f'Данные созданы за {time.monotonic() - started:.0f} с'
+        ))
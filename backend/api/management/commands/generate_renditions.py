@@ -0,0 +1,40 @@
+from django.core.management import BaseCommand
+
+from api.images import make_renditions
+from recipes.models import Recipe
+
+
+class Command(BaseCommand):
+    '''
+    Создание уменьшенных копий картинок рецептов.
+    '''
+
+    help = (
+        'Создаёт уменьшенные копии картинок для рецептов, у которых их нет'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--all', action='store_true',
+            help='Пересоздать копии для всех рецептов',
+        )
+
+    def handle(self, *args, **options):
+        recipes = Recipe.objects.exclude(image='').only('image')
+        if not options['all']:
+            recipes = recipes.filter(image_renditions={})
+        done = failed = 0
+        for recipe in recipes.iterator():
+            try:
+                renditions = make_renditions(recipe.image)
+            except (OSError, ValueError) as error:
+                failed += 1
+                self.stderr.write(f'{recipe.image.name}: {error}')
+                continue
+            Recipe.objects.filter(pk=recipe.pk).update(
+                image_renditions=renditions
+            )
+            done += 1
+        self.stdout.write(self.style.SUCCESS(
+            f'Обработано {done} рецептов, с ошибками {failed}'
+        ))
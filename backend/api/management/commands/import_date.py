@@ -1,24 +1,125 @@
+import csv
 import json
+import os
+import re
+import time
 
-from django.core.management import BaseCommand
+from django.core.management import BaseCommand, CommandError
+from django.db import transaction
 
+from api.cache import invalidate_ingredients
 from recipes.models import Ingredient
 
+READ_SIZE = 64 * 1024
+SEPARATORS = re.compile(r'[\s,]*')
+
+
+def read_json(file):
+    '''
+    Построчное чтение JSON-массива без загрузки файла в память.
+    '''
+    decoder = json.JSONDecoder()
+    buffer = file.read(READ_SIZE).lstrip()
+    if not buffer.startswith('['):
+        raise CommandError('Ожидается JSON-массив объектов')
+    pos = 1
+    while True:
+        pos = SEPARATORS.match(buffer, pos).end()
+        if buffer.startswith(']', pos):
+            return
+        try:
+            row, pos = decoder.raw_decode(buffer, pos)
+        except json.JSONDecodeError:
+            chunk = file.read(READ_SIZE)
+            if not chunk:
+                raise CommandError('Файл JSON оборван или повреждён')
+            buffer = buffer[pos:] + chunk
+            pos = 0
+            continue
+        yield row['name'], row['measurement_unit']
+
+
+def read_csv(file):
+    for row in csv.reader(file):
+        if len(row) >= 2:
+            yield row[0], row[1]
+
+
+READERS = {
+    'json': read_json,
+    'csv': read_csv,
+}
+
 
 class Command(BaseCommand):
     '''
     Заполнение БД модели Ingredient.
     '''
 
-    help = 'Импорт данных из ingredients.json в таблицу recipes_ingredient'
+    help = (
+        'Импорт данных из ingredients.json или ingredients.csv '
+        'в таблицу recipes_ingredient'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--path', default='data/ingredients.json',
+            help='Путь к файлу с ингредиентами',
+        )
+        parser.add_argument(
+            '--format', choices=READERS,
+            help='Формат файла, по умолчанию определяется по расширению',
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=5000,
+            help='Количество строк в одном INSERT',
+        )
+
+    def handle(self, *args, **options):
+        path = options['path']
+        file_format = (
+            options['format'] or os.path.splitext(path)[1].lstrip('.')
+        )
+        if file_format not in READERS:
+            raise CommandError(f'Неизвестный формат файла: {path}')
+        batch_size = options['batch_size']
+        self.verbosity = options['verbosity']
+
+        started = time.monotonic()
+        total = 0
+        before = Ingredient.objects.count()
+        with open(path, 'r', encoding='utf-8') as f, transaction.atomic():
+            batch = []
+            for name, measurement_unit in READERS[file_format](f):
+                name, measurement_unit = name.strip(), measurement_unit.strip()
+                if not name or not measurement_unit:
+                    continue
+                batch.append(Ingredient(
+                    name=name,
+                    measurement_unit=measurement_unit,
+                ))
+                if len(batch) >= batch_size:
+                    total = self.save_batch(batch, total, started)
+                    batch = []
+            if batch:
+                total = self.save_batch(batch, total, started)
+        created = Ingredient.objects.count() - before
+        # bulk_create не вызывает сигналы, сбрасывающие кэш справочника.
+        invalidate_ingredients()
 
-    def handle(self, *args, **kwargs):
-        with open('data/ingredients.json', 'r', encoding='utf-8') as f:
-            data = json.load(f)
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Обработано {total} строк за {elapsed:.2f} с '
+            f'({total / elapsed if elapsed else total:.0f} строк/с): '
+            f'добавлено {created}, уже были в базе {total - created}'
+        ))
 
-        for row in data:
-            account = Ingredient(
-                name=row['name'],
-                measurement_unit=row['measurement_unit']
+    def save_batch(self, batch, total, started):
+        Ingredient.objects.bulk_create(batch, ignore_conflicts=True)
+        total += len(batch)
+        if self.verbosity > 1:
+            self.stdout.write(
+                f'Обработано {total} строк, '
+                f'{time.monotonic() - started:.2f} с'
             )
-            account.save()
+        return total
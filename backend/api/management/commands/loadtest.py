@@ -0,0 +1,50 @@
+from django.core.management import BaseCommand
+
+from api.benchmarks import LOAD_TEST_PATHS, load_test
+
+
+class Command(BaseCommand):
+    '''
+    Нагрузочный тест запущенного сервера.
+    '''
+
+    help = (
+        'Отправляет параллельные запросы к серверу и выводит пропускную '
+        'способность; запустите для WSGI и ASGI и сравните результаты'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--url', default='http://127.0.0.1:8000',
+            help='Адрес сервера',
+        )
+        parser.add_argument(
+            '--path', action='append', dest='paths',
+            help=(
+                'Путь запроса, можно указать несколько раз; '
+                'по умолчанию рецепты, теги и ингредиенты'
+            ),
+        )
+        parser.add_argument(
+            '--concurrency', type=int, default=50,
+            help='Число одновременных клиентов',
+        )
+        parser.add_argument(
+            '--requests', type=int, default=1000,
+            help='Общее число запросов',
+        )
+
+    def handle(self, *args, **options):
+        paths = options['paths'] or LOAD_TEST_PATHS
+        for concurrency in sorted({1, options['concurrency']}):
+            result = load_test(
+                options['url'].rstrip('/'), paths,
+                concurrency, options['requests'],
+            )
+            self.stdout.write(
+                f'клиентов: {concurrency:<5}'
+                f'запросов/с: {result["rps"]:>8.1f}  '
+                f'p50: {result["p50"]:>7.1f} мс  '
+                f'p95: {result["p95"]:>7.1f} мс  '
+                f'ошибок: {result["errors"]}'
+            )
@@ -0,0 +1,19 @@
+from django.core.management import BaseCommand
+
+from recipes.feed import rebuild
+
+
+class Command(BaseCommand):
+    '''
+    Пересборка лент подписок.
+    '''
+
+    help = (
+        'Заново заполняет ленты подписчиков последними рецептами авторов; '
+        'нужна после загрузки данных в обход сигналов и после изменения '
+        'FEED_FANOUT_LIMIT'
+    )
+
+    def handle(self, *args, **options):
+        total = rebuild(log=self.stdout.write)
+        self.stdout.write(f'Записей ленты: {total}')
@@ -0,0 +1,46 @@
+from django.core.management import BaseCommand
+from django.db import transaction
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from recipes.models import FavoriteRecipe, Recipe
+from users.models import Follow, User
+
+COUNTERS = (
+    (Recipe, 'favorites_count', FavoriteRecipe, 'recipe'),
+    (User, 'recipes_count', Recipe, 'author'),
+    (User, 'followers_count', Follow, 'author'),
+)
+
+
+def actual_count(related_model, field):
+    return Coalesce(Subquery(
+        related_model.objects.filter(**{field: OuterRef('pk')})
+        .order_by()
+        .values(field)
+        .annotate(total=Count('pk'))
+        .values('total')
+    ), 0)
+
+
+class Command(BaseCommand):
+    '''
+    Пересчёт денормализованных счётчиков.
+    '''
+
+    help = (
+        'Пересчитывает счётчики избранного, рецептов и подписчиков '
+        'и исправляет разошедшиеся значения'
+    )
+
+    def handle(self, *args, **kwargs):
+        with transaction.atomic():
+            for model, counter, related_model, field in COUNTERS:
+                actual = actual_count(related_model, field)
+                fixed = model.objects.exclude(
+                    **{counter: actual}
+                ).update(**{counter: actual})
+                self.stdout.write(
+                    f'{model._meta.model_name}.{counter}: '
+                    f'исправлено {fixed}'
+                )
@@ -0,0 +1,24 @@
+from django.core.management import BaseCommand
+
+from api.popularity import refresh
+
+
+class Command(BaseCommand):
+    '''
+    Пересчёт популярности рецептов.
+    '''
+
+    help = (
+        'Пересчитывает популярность рецептов с новыми добавлениями '
+        'в избранное и списки покупок; --full пересчитывает все рецепты'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--full', action='store_true',
+            help='Пересчитать все рецепты и учесть удаления',
+        )
+
+    def handle(self, *args, **options):
+        refreshed = refresh(full=options['full'])
+        self.stdout.write(f'Пересчитано рецептов: {refreshed}')
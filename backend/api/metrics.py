@@ -0,0 +1,175 @@
+import os
+import time
+from collections import defaultdict
+from contextvars import ContextVar
+from functools import wraps
+from threading import Lock
+
+from api.cache import cache_metrics
+
+DURATION_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+current_stats = ContextVar('current_stats', default=None)
+
+
+class RequestStats:
+    """Стоимость одного запроса."""
+
+    def __init__(self):
+        self.view = 'unknown'
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.sql_time = 0.0
+        self.serializer_time = 0.0
+
+
+def record_query(execute, sql, params, many, context):
+    stats = current_stats.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats.queries += 1
+        stats.sql_time += time.perf_counter() - started
+
+
+def instrument_connection(connection):
+    """Подключает учёт запросов к соединению, если его ещё нет."""
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+def profile_serializer(serializer):
+    """Учитывает время to_representation сериализатора верхнего уровня."""
+    to_representation = serializer.to_representation
+
+    @wraps(to_representation)
+    def timed(*args, **kwargs):
+        stats = current_stats.get()
+        started = time.perf_counter()
+        try:
+            return to_representation(*args, **kwargs)
+        finally:
+            if stats is not None:
+                stats.serializer_time += time.perf_counter() - started
+
+    serializer.to_representation = timed
+    return serializer
+
+
+class SerializerTimingMixin:
+    """Время сериализации ответов вьюсета попадает в метрики."""
+
+    def get_serializer(self, *args, **kwargs):
+        return profile_serializer(super().get_serializer(*args, **kwargs))
+
+
+class ViewMetrics:
+    def __init__(self):
+        self.count = 0
+        self.buckets = [0] * len(DURATION_BUCKETS)
+        self.duration = 0.0
+        self.queries = 0
+        self.sql_time = 0.0
+        self.serializer_time = 0.0
+        self.response_bytes = 0
+        self.over_budget = 0
+
+
+class Metrics:
+    """
+    Суммарная стоимость запросов по представлениям.
+
+    Счётчики живут в памяти процесса: каждый воркер отдаёт свои
+    с меткой pid, суммировать их нужно в запросах Prometheus.
+    """
+
+    def __init__(self):
+        self._views = defaultdict(ViewMetrics)
+        self._lock = Lock()
+
+    def observe(self, stats, duration, response_bytes, over_budget):
+        with self._lock:
+            metrics = self._views[stats.view]
+            metrics.count += 1
+            for number, bound in enumerate(DURATION_BUCKETS):
+                if duration <= bound:
+                    metrics.buckets[number] += 1
+            metrics.duration += duration
+            metrics.queries += stats.queries
+            metrics.sql_time += stats.sql_time
+            metrics.serializer_time += stats.serializer_time
+            metrics.response_bytes += response_bytes
+            metrics.over_budget += over_budget
+
+    def render(self):
+        """Метрики в текстовом формате Prometheus."""
+        with self._lock:
+            views = sorted(
+                (view, vars(metrics).copy())
+                for view, metrics in self._views.items()
+            )
+        pid = os.getpid()
+        lines = [
+            '# HELP foodgram_request_duration_seconds '
+            'Время обработки запроса.',
+            '# TYPE foodgram_request_duration_seconds histogram',
+        ]
+        for view, metrics in views:
+            for bound, total in zip(DURATION_BUCKETS, metrics['buckets']):
+                lines.append(
+                    'foodgram_request_duration_seconds_bucket'
+                    f'{{view="{view}",pid="{pid}",le="{bound}"}} {total}'
+                )
+            lines += [
+                'foodgram_request_duration_seconds_bucket'
+                f'{{view="{view}",pid="{pid}",le="+Inf"}} {metrics["count"]}',
+                'foodgram_request_duration_seconds_sum'
+                f'{{view="{view}",pid="{pid}"}} {metrics["duration"]:.6f}',
+                'foodgram_request_duration_seconds_count'
+                f'{{view="{view}",pid="{pid}"}} {metrics["count"]}',
+            ]
+        for name, field, help_text in COUNTERS:
+            lines += [
+                f'# HELP {name} {help_text}',
+                f'# TYPE {name} counter',
+            ]
+            lines += [
+                f'{name}{{view="{view}",pid="{pid}"}} {metrics[field]:g}'
+                for view, metrics in views
+            ]
+        lines += [
+            '# HELP foodgram_response_cache_total '
+            'Попадания и промахи кэша ответов.',
+            '# TYPE foodgram_response_cache_total counter',
+        ]
+        for cache_name, (hits, misses) in cache_metrics().items():
+            lines += [
+                f'foodgram_response_cache_total'
+                f'{{cache="{cache_name}",result="hit"}} {hits}',
+                f'foodgram_response_cache_total'
+                f'{{cache="{cache_name}",result="miss"}} {misses}',
+            ]
+        return '\n'.join(lines) + '\n'
+
+
+COUNTERS = (
+    ('foodgram_db_queries_total', 'queries', 'Число SQL-запросов.'),
+    ('foodgram_db_seconds_total', 'sql_time', 'Время SQL-запросов.'),
+    (
+        'foodgram_serializer_seconds_total', 'serializer_time',
+        'Время сериализации ответа.',
+    ),
+    (
+        'foodgram_response_bytes_total', 'response_bytes',
+        'Размер ответов в байтах.',
+    ),
+    (
+        'foodgram_query_budget_exceeded_total', 'over_budget',
+        'Запросы, превысившие QUERY_BUDGET.',
+    ),
+)
+
+metrics = Metrics()
@@ -0,0 +1,98 @@
+import asyncio
+import logging
+import time
+
+from django.conf import settings
+
+from api.metrics import RequestStats, current_stats, metrics
+
+logger = logging.getLogger(__name__)
+
+
+def view_name(view_func, method):
+    """Имя представления DRF вида RecipeViewSet.list."""
+    cls = getattr(view_func, 'cls', None)
+    if cls is None:
+        return f'{view_func.__module__}.{view_func.__name__}'
+    actions = getattr(view_func, 'actions', None) or {}
+    action = actions.get(method.lower(), method.lower())
+    return f'{cls.__name__}.{action}'
+
+
+class PerformanceMiddleware:
+    """
+    Время, число и длительность SQL-запросов, время сериализации
+    и размер ответа для каждого запроса.
+
+    Запросы дороже QUERY_BUDGET SQL-запросов попадают в лог
+    и помечаются заголовком X-Query-Count. Работает и под WSGI,
+    и под ASGI: синхронная middleware заставила бы Django выполнять
+    все запросы по очереди в одном потоке.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if asyncio.iscoroutinefunction(get_response):
+            # Как в MiddlewareMixin: Django вызовет __call__ через await.
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        stats = RequestStats()
+        token = current_stats.set(stats)
+        try:
+            response = self.get_response(request)
+        finally:
+            current_stats.reset(token)
+        return self.finish_response(request, response, stats)
+
+    async def __acall__(self, request):
+        stats = RequestStats()
+        token = current_stats.set(stats)
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_stats.reset(token)
+        return self.finish_response(request, response, stats)
+
+    def finish_response(self, request, response, stats):
+        # Не process_view: под ASGI синхронный process_view выполнялся бы
+        # в общем потоке Django.
+        if request.resolver_match is not None:
+            stats.view = view_name(request.resolver_match.func, request.method)
+        if response.streaming:
+            response.streaming_content = self.stream(
+                response.streaming_content, stats
+            )
+        else:
+            self.finish(stats, response, len(response.content))
+        return response
+
+    def stream(self, content, stats):
+        size = 0
+        token = current_stats.set(stats)
+        try:
+            for chunk in content:
+                size += len(chunk)
+                yield chunk
+        finally:
+            current_stats.reset(token)
+            self.finish(stats, None, size)
+
+    def finish(self, stats, response, size):
+        budget = settings.QUERY_BUDGET
+        over_budget = bool(budget) and stats.queries > budget
+        if over_budget:
+            logger.warning(
+                '%s: %s SQL-запросов при бюджете %s',
+                stats.view, stats.queries, budget,
+            )
+            if response is not None:
+                response['X-Query-Count'] = stats.queries
+        metrics.observe(
+            stats, time.perf_counter() - stats.started, size, over_budget
+        )
@@ -1,7 +1,249 @@
-from rest_framework.pagination import PageNumberPagination
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from collections import OrderedDict
+
+from django.core.exceptions import ValidationError
+from django.db import connection
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+from recipes.feed import celebrity_authors
+from recipes.models import FeedEntry, Recipe
 
 
 class LimitPagesPaginator(PageNumberPagination):
     """Пагинация с перееопределением названия поля."""
 
     page_size_query_param = "limit"
+
+
+class KeysetPaginator(BasePagination):
+    """
+    Пагинация по ключу сортировки без COUNT и OFFSET.
+
+    Курсор хранит значения полей сортировки крайней записи страницы,
+    поэтому время ответа не зависит от номера страницы.
+    """
+
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'limit'
+    page_size = 6
+    max_page_size = 100
+    ordering = ('-pub_date', '-id')
+    invalid_cursor_message = 'Некорректный курсор'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+        self.model = queryset.model
+        position, reverse = self.decode_cursor(request)
+        ordering = self.ordering
+        if reverse:
+            ordering = tuple(
+                field[1:] if field.startswith('-') else f'-{field}'
+                for field in ordering
+            )
+        results = self.fetch(queryset, position, ordering)
+        has_more = len(results) > self.page_size
+        results = results[:self.page_size]
+        if reverse:
+            results.reverse()
+            self.has_next, self.has_previous = True, has_more
+        else:
+            self.has_next, self.has_previous = has_more, position is not None
+        self.page = results
+        return results
+
+    def fetch(self, queryset, position, ordering):
+        """Страница и ещё одна запись, чтобы узнать, есть ли следующая."""
+        return list(self.page_queryset(queryset, position, ordering))
+
+    def page_queryset(self, queryset, position, ordering):
+        queryset = queryset.order_by(*ordering)
+        if position is not None:
+            queryset = queryset.filter(self.seek(position, ordering))
+        return queryset[:self.page_size + 1]
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        if page_size <= 0:
+            return self.page_size
+        return min(page_size, self.max_page_size)
+
+    @staticmethod
+    def seek(position, ordering):
+        """Условие «строго после позиции» для составного ключа."""
+        condition = Q()
+        equal = {}
+        for field, value in zip(ordering, position):
+            name = field.lstrip('-')
+            lookup = 'lt' if field.startswith('-') else 'gt'
+            condition |= Q(**equal, **{f'{name}__{lookup}': value})
+            equal[name] = value
+        return condition
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None, False
+        try:
+            cursor = json.loads(urlsafe_b64decode(encoded.encode('ascii')))
+            position = [
+                self.to_python(field.lstrip('-'), value)
+                for field, value in zip(self.ordering, cursor['p'])
+            ]
+            reverse = bool(cursor['r'])
+        except (KeyError, TypeError, ValueError, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+        if len(position) != len(self.ordering):
+            raise NotFound(self.invalid_cursor_message)
+        return position, reverse
+
+    def to_python(self, name, value):
+        return self.model._meta.get_field(name).to_python(value)
+
+    def encode_cursor(self, obj, reverse):
+        position = []
+        for field in self.ordering:
+            value = getattr(obj, field.lstrip('-'))
+            position.append(
+                value.isoformat() if hasattr(value, 'isoformat') else value
+            )
+        cursor = json.dumps({'p': position, 'r': int(reverse)})
+        return replace_query_param(
+            self.base_url, self.cursor_query_param,
+            urlsafe_b64encode(cursor.encode('ascii')).decode('ascii'),
+        )
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(self.page[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous or not self.page:
+            return None
+        return self.encode_cursor(self.page[0], reverse=True)
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict((
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data),
+        )))
+
+
+class UserKeysetPaginator(KeysetPaginator):
+    """Пагинация пользователей по ключу."""
+
+    ordering = ('id',)
+
+
+class PopularKeysetPaginator(KeysetPaginator):
+    """Пагинация по ключу для рецептов, упорядоченных по популярности."""
+
+    ordering = ('-popularity_score', '-id')
+
+    def to_python(self, name, value):
+        if name == 'popularity_score':
+            return float(value)
+        return super().to_python(name, value)
+
+
+class SearchKeysetPaginator(KeysetPaginator):
+    """
+    Пагинация по ключу для результатов поиска по релевантности.
+
+    Релевантность rank считает только полнотекстовый поиск PostgreSQL;
+    без неё поиск сохраняет обычный порядок по дате.
+    """
+
+    ordering = ('-rank', '-pub_date', '-id')
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if 'rank' not in queryset.query.annotations:
+            self.ordering = KeysetPaginator.ordering
+        return super().paginate_queryset(queryset, request, view)
+
+    def to_python(self, name, value):
+        if name == 'rank':
+            return float(value)
+        return super().to_python(name, value)
+
+
+class FeedPaginator(KeysetPaginator):
+    """
+    Лента рецептов подписок.
+
+    Ключи страницы берутся из FeedEntry и из рецептов авторов без
+    рассылки и сливаются; каждый источник читается по индексу не больше
+    чем на страницу, сколько бы ни было подписок. Рецепты каждого
+    автора без рассылки читаются отдельным подзапросом по индексу
+    recipe_author_pub_date_idx, авторов не больше FEED_MAX_CELEBRITIES.
+    """
+
+    def fetch(self, queryset, position, ordering):
+        user = self.request.user
+        entry_ordering = tuple(
+            field.replace('id', 'recipe_id') for field in ordering
+        )
+        keys = dict(super().fetch(
+            FeedEntry.objects.filter(user=user).values_list(
+                'recipe_id', 'pub_date'
+            ),
+            position, entry_ordering,
+        ))
+        keys.update(self.celebrity_keys(
+            celebrity_authors(user), position, ordering
+        ))
+        page = sorted(
+            keys, key=lambda pk: (keys[pk], pk),
+            reverse=ordering[0].startswith('-'),
+        )[:self.page_size + 1]
+        recipes = queryset.in_bulk(page)
+        return [recipes[pk] for pk in page if pk in recipes]
+
+    def celebrity_keys(self, author_ids, position, ordering):
+        parts = [
+            self.page_queryset(
+                Recipe.objects.filter(author_id=author_id).values_list(
+                    'id', 'pub_date'
+                ),
+                position, ordering,
+            )
+            for author_id in author_ids
+        ]
+        if not parts:
+            return []
+        if connection.features.supports_slicing_ordering_in_compound:
+            return list(parts[0].union(*parts[1:], all=True))
+        return [key for part in parts for key in part]
+
+
+class KeysetPaginationMixin:
+    """
+    Пагинация по ключу включается параметром cursor.
+
+    Для первой страницы достаточно передать пустой cursor.
+    """
+
+    keyset_pagination_class = KeysetPaginator
+
+    @property
+    def paginator(self):
+        if not hasattr(self, '_paginator'):
+            query_params = self.request.query_params
+            if KeysetPaginator.cursor_query_param in query_params:
+                self._paginator = self.keyset_pagination_class()
+            elif self.pagination_class is None:
+                self._paginator = None
+            else:
+                self._paginator = self.pagination_class()
+        return self._paginator
@@ -0,0 +1,107 @@
+import math
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Max
+from django.db.models.functions import TruncDay
+from django.utils import timezone as django_timezone
+
+from api.cache import bump_catalog_version
+from recipes.models import FavoriteRecipe, RecipePopularity, ShoppingCart
+
+# Начало отсчёта для score; при изменении нужен полный пересчёт.
+EPOCH = datetime(2000, 1, 1, tzinfo=timezone.utc)
+SOURCES = (
+    (FavoriteRecipe, 'favorites'),
+    (ShoppingCart, 'shopping_cart'),
+)
+# Добавления, закоммиченные во время прошлого пересчёта, могли
+# не попасть в него: такие рецепты пересчитываются ещё раз.
+OVERLAP = timedelta(minutes=5)
+BATCH_SIZE = 1000
+
+
+def exponent(day, total, weight):
+    """Логарифм веса добавлений за день на шкале от EPOCH."""
+    half_life = settings.POPULARITY_HALF_LIFE_DAYS * 24 * 3600
+    return (
+        (day - EPOCH).total_seconds() / half_life
+        + math.log2(total * weight)
+    )
+
+
+def log_sum(exponents):
+    """log2(sum(2 ** x)) без переполнения."""
+    top = max(exponents)
+    return top + math.log2(sum(2 ** (x - top) for x in exponents))
+
+
+def scores(recipe_ids=None):
+    """
+    Score рецептов по добавлениям, сгруппированным по дням.
+
+    recipe_ids=None — по всем рецептам.
+    """
+    exponents = defaultdict(list)
+    for model, name in SOURCES:
+        weight = settings.POPULARITY_WEIGHTS[name]
+        queryset = model.objects.all()
+        if recipe_ids is not None:
+            queryset = queryset.filter(recipe_id__in=recipe_ids)
+        for recipe_id, day, total in queryset.annotate(
+            day=TruncDay('created')
+        ).order_by().values('recipe_id', 'day').annotate(
+            total=Count('pk')
+        ).values_list('recipe_id', 'day', 'total').iterator():
+            exponents[recipe_id].append(exponent(day, total, weight))
+    return {
+        recipe_id: log_sum(values) for recipe_id, values in exponents.items()
+    }
+
+
+def changed_recipes(since):
+    recipe_ids = set()
+    for model, _ in SOURCES:
+        recipe_ids.update(model.objects.filter(
+            created__gte=since - OVERLAP
+        ).order_by().values_list('recipe_id', flat=True).distinct())
+    return sorted(recipe_ids)
+
+
+def save_scores(recipe_scores, updated):
+    RecipePopularity.objects.bulk_create((
+        RecipePopularity(recipe_id=recipe_id, score=score, updated=updated)
+        for recipe_id, score in recipe_scores.items()
+    ), batch_size=BATCH_SIZE)
+
+
+def refresh(full=False):
+    """
+    Пересчитывает популярность рецептов; возвращает число пересчитанных.
+
+    Без full пересчитываются только рецепты с добавлениями после
+    прошлого пересчёта. Удаления из избранного и списков покупок
+    учитываются при полном пересчёте.
+    """
+    started = django_timezone.now()
+    last = RecipePopularity.objects.aggregate(last=Max('updated'))['last']
+    if full or last is None:
+        recipe_scores = scores()
+        with transaction.atomic():
+            RecipePopularity.objects.all().delete()
+            save_scores(recipe_scores, started)
+        refreshed = len(recipe_scores)
+    else:
+        recipe_ids = changed_recipes(last)
+        for start in range(0, len(recipe_ids), BATCH_SIZE):
+            batch = recipe_ids[start:start + BATCH_SIZE]
+            recipe_scores = scores(batch)
+            with transaction.atomic():
+                RecipePopularity.objects.filter(recipe_id__in=batch).delete()
+                save_scores(recipe_scores, started)
+        refreshed = len(recipe_ids)
+    if refreshed:
+        bump_catalog_version('recipes:popular')
+    return refreshed
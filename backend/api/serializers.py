@@ -1,15 +1,25 @@
+from django.conf import settings
 from django.core.exceptions import ValidationError
+from django.db import transaction
 from django.shortcuts import get_object_or_404
 from djoser.serializers import UserSerializer
-from drf_extra_fields.fields import Base64ImageField
 from rest_framework import serializers
 
-from recipes.models import (FavoriteRecipe, Ingredient, Recipe,
-                            RecipeIngredient, ShoppingCart)
+from api.images import (RecipeImageField, RecipeImageRenditionField,
+                        schedule_renditions)
+from api.user_state import get_user_state
+from recipes.models import Ingredient, Recipe, RecipeIngredient
 from tag.models import Tag
 from users.models import Follow, User
 
 
+def get_recipes_limit(request, default=6):
+    try:
+        return int(request.query_params.get('recipes_limit')) or default
+    except (ValueError, TypeError):
+        return default
+
+
 class UserSerializer(serializers.ModelSerializer):
     """Сериализатор пользователя."""
 
@@ -23,9 +33,12 @@ class UserSerializer(serializers.ModelSerializer):
         )
 
     def get_is_subscribed(self, obj):
-        user = self.context.get('request').user.id
-        return Follow.objects.filter(
-            author=obj.id, user=user).exists()
+        if hasattr(obj, 'is_subscribed'):
+            return obj.is_subscribed
+        request = self.context.get('request')
+        if not request:
+            return False
+        return obj.id in get_user_state(request).following
 
     def create(self, validated_data):
         author = validated_data.get('author')
@@ -53,7 +66,7 @@ class IngredientSerializer(serializers.ModelSerializer):
 class ShortRecipeSerializer(serializers.ModelSerializer):
     """Сериализатор краткого отображения рецепта."""
 
-    image = Base64ImageField()
+    image = RecipeImageRenditionField('thumbnail')
 
     class Meta:
         model = Recipe
@@ -89,7 +102,7 @@ class ShowRecipeSerializer(serializers.ModelSerializer):
     ingredients = ShowIngredientsInRecipeSerializer(
         many=True, read_only=True, source='recipe_ingredient'
     )
-    image = Base64ImageField()
+    image = RecipeImageRenditionField('full', list_rendition='card')
     is_favorited = serializers.SerializerMethodField()
     is_in_shopping_cart = serializers.SerializerMethodField()
 
@@ -101,30 +114,52 @@ class ShowRecipeSerializer(serializers.ModelSerializer):
         )
 
     def get_is_favorited(self, obj):
+        if hasattr(obj, 'is_favorited'):
+            return obj.is_favorited
         request = self.context.get('request')
-        if not request or request.user.is_anonymous:
+        if not request:
             return False
-        return FavoriteRecipe.objects.filter(
-            recipe=obj, user=request.user
-        ).exists()
+        return obj.id in get_user_state(request).favorites
 
     def get_is_in_shopping_cart(self, obj):
+        if hasattr(obj, 'is_in_shopping_cart'):
+            return obj.is_in_shopping_cart
         request = self.context.get('request')
-        if not request or request.user.is_anonymous:
+        if not request:
             return False
-        return ShoppingCart.objects.filter(
-            recipe=obj, user=request.user
-        ).exists()
+        return obj.id in get_user_state(request).shopping_cart
+
+
+class AddIngredientInRecipeSerializer(serializers.ModelSerializer):
+    """
+    Сериализатор ингредиента при создании рецепта.
+
+    Существование ингредиентов проверяется сразу для всего списка
+    в AddRecipeSerializer.validate_ingredients.
+    """
+
+    id = serializers.IntegerField()
+
+    class Meta:
+        model = RecipeIngredient
+        fields = ('id', 'amount')
+
+
+def missing_ids_error(message, ids):
+    return serializers.ValidationError(
+        f'{message}: {", ".join(str(pk) for pk in sorted(ids))}'
+    )
 
 
 class AddRecipeSerializer(serializers.ModelSerializer):
     """Сериализатор добавления рецепта."""
 
-    tags = serializers.PrimaryKeyRelatedField(queryset=Tag.objects.all(),
-                                              many=True)
+    tags = serializers.ListField(
+        child=serializers.IntegerField(), allow_empty=False
+    )
     author = UserSerializer(read_only=True)
-    ingredients = ShowIngredientsInRecipeSerializer(many=True)
-    image = Base64ImageField()
+    ingredients = AddIngredientInRecipeSerializer(many=True)
+    image = RecipeImageField()
 
     class Meta:
         model = Recipe
@@ -149,8 +184,22 @@ class AddRecipeSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError(
                 'Ингредиенты должны быть уникальными'
             )
+        found = Ingredient.objects.in_bulk(unique_ingredient_list)
+        missing = unique_ingredient_list - found.keys()
+        if missing:
+            raise missing_ids_error('Ингредиенты не найдены', missing)
+        for ingredient in value:
+            ingredient['id'] = found[ingredient['id']]
         return value
 
+    def validate_tags(self, value):
+        tag_ids = set(value)
+        found = Tag.objects.in_bulk(tag_ids)
+        missing = tag_ids - found.keys()
+        if missing:
+            raise missing_ids_error('Теги не найдены', missing)
+        return list(found.values())
+
     @staticmethod
     def __add_ingredients(ingredients, recipe):
         ingredients_list = [
@@ -163,6 +212,7 @@ class AddRecipeSerializer(serializers.ModelSerializer):
         ]
         RecipeIngredient.objects.bulk_create(ingredients_list)
 
+    @transaction.atomic
     def create(self, validated_data):
         author = self.context.get('request').user
         tags = validated_data.pop('tags')
@@ -173,27 +223,88 @@ class AddRecipeSerializer(serializers.ModelSerializer):
         )
         self.__add_ingredients(ingredients, recipe)
         recipe.tags.set(tags)
+        Recipe.objects.filter(pk=recipe.pk).update_search_vector()
+        schedule_renditions(recipe)
         return recipe
 
+    @staticmethod
+    def __update_ingredients(ingredients, recipe):
+        """Вставляет новые, обновляет изменённые и удаляет лишние строки."""
+        amounts = {
+            ingredient['id'].id: ingredient['amount']
+            for ingredient in ingredients
+        }
+        current = {
+            recipe_ingredient.ingredient_id: recipe_ingredient
+            for recipe_ingredient in RecipeIngredient.objects.filter(
+                recipe=recipe
+            )
+        }
+        removed = current.keys() - amounts.keys()
+        if removed:
+            RecipeIngredient.objects.filter(
+                recipe=recipe, ingredient_id__in=removed
+            ).delete()
+        changed = []
+        for ingredient_id, amount in amounts.items():
+            recipe_ingredient = current.get(ingredient_id)
+            if recipe_ingredient and recipe_ingredient.amount != amount:
+                recipe_ingredient.amount = amount
+                changed.append(recipe_ingredient)
+        RecipeIngredient.objects.bulk_update(changed, ('amount',))
+        RecipeIngredient.objects.bulk_create([
+            RecipeIngredient(
+                recipe=recipe, ingredient_id=ingredient_id, amount=amount
+            )
+            for ingredient_id, amount in amounts.items()
+            if ingredient_id not in current
+        ])
+
+    @transaction.atomic
     def update(self, recipe, validated_data):
-        ingredients = validated_data.pop('ingredients')
-        tags = validated_data.pop('tags')
-        RecipeIngredient.objects.filter(recipe=recipe).delete()
-        self.__add_ingredients(ingredients, recipe)
-        recipe.tags.set(tags)
-        return super().update(recipe, validated_data)
+        Recipe.objects.select_for_update().values('pk').get(pk=recipe.pk)
+        ingredients = validated_data.pop('ingredients', None)
+        tags = validated_data.pop('tags', None)
+        if ingredients is not None:
+            self.__update_ingredients(ingredients, recipe)
+        if tags is not None:
+            # set() сам сравнивает с текущими тегами и пишет только разницу.
+            recipe.tags.set(tags)
+        old_image = recipe.image.name
+        recipe = super().update(recipe, validated_data)
+        Recipe.objects.filter(pk=recipe.pk).update_search_vector()
+        # Повторно отправленная картинка получает то же имя в хранилище.
+        if recipe.image.name != old_image:
+            recipe.image_renditions = {}
+            Recipe.objects.filter(pk=recipe.pk).update(image_renditions={})
+            schedule_renditions(recipe)
+        return recipe
 
     def to_representation(self, instance):
         request = self.context.get('request')
         context = {'request': request}
+        # Перечитываем рецепт с prefetch, иначе каждый ингредиент
+        # ответа загружается отдельным запросом.
+        instance = Recipe.objects.for_display(request.user).get(
+            pk=instance.pk
+        )
         return ShowRecipeSerializer(instance,
                                     context=context).data
 
 
+class BulkIdsSerializer(serializers.Serializer):
+    """Список id для пакетных запросов."""
+
+    ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=settings.BULK_MAX_ITEMS,
+    )
+
+
 class FollowSerializer(UserSerializer):
     """Сериализатор подписoк."""
-    recipes_count = serializers.IntegerField(source='recipes.count',
-                                             read_only=True)
+    recipes_count = serializers.IntegerField(read_only=True)
     recipes = serializers.SerializerMethodField(method_name='get_recipes')
     is_subscribed = serializers.BooleanField(default=True)
 
@@ -217,15 +328,11 @@ class FollowSerializer(UserSerializer):
         return data
 
     def get_recipes(self, obj):
-        default = 6
-        try:
-            recipes_limit = int(
-                self.context['request'].query_params.get('recipes_limit')
-            ) or default
-        except (ValueError, TypeError):
-            recipes_limit = default
-
+        recipes = getattr(obj, 'latest_recipes', None)
+        if recipes is None:
+            recipes_limit = get_recipes_limit(self.context['request'])
+            recipes = obj.recipes.all()[:recipes_limit]
         return ShortRecipeSerializer(
-            instance=obj.recipes.all()[:recipes_limit],
+            instance=recipes,
             many=True
         ).data
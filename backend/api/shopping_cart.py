@@ -1,16 +1,110 @@
-from django.http import HttpResponse
+import csv
+import os
+from io import BytesIO
 
+from django.conf import settings
+from django.http import StreamingHttpResponse
 
-def shopping_cart(ingredients):
-    text_cart = ''
+ROWS_PER_CHUNK = 500
+
+
+class Echo:
+    """Псевдо-файл для csv.writer, возвращающий записанную строку."""
+
+    def write(self, value):
+        return value
+
+
+def _chunks(lines):
+    """Объединяет строки в куски, чтобы не отдавать их по одной."""
+    chunk = []
+    for line in lines:
+        chunk.append(line)
+        if len(chunk) >= ROWS_PER_CHUNK:
+            yield ''.join(chunk)
+            chunk = []
+    if chunk:
+        yield ''.join(chunk)
+
+
+def _text_lines(ingredients):
     for ingredient in ingredients:
-        text_cart += (
+        yield (
             f'{ingredient.get("ingredient__name")} '
             f'{ingredient.get("sum_ingredients")}'
             f'({ingredient.get("ingredient__measurement_unit")})\n'
         )
-    response = HttpResponse(text_cart, 'text/plain,charset=utf8')
+
+
+def _csv_lines(ingredients):
+    writer = csv.writer(Echo())
+    # BOM нужен, чтобы Excel распознал кириллицу в UTF-8.
+    yield '\ufeff' + writer.writerow(
+        ('Ингредиент', 'Количество', 'Единица измерения')
+    )
+    for ingredient in ingredients:
+        yield writer.writerow((
+            ingredient.get('ingredient__name'),
+            ingredient.get('sum_ingredients'),
+            ingredient.get('ingredient__measurement_unit'),
+        ))
+
+
+def _pdf_content(ingredients):
+    """
+    PDF собирается целиком в памяти: таблица ссылок пишется в конце файла.
+    """
+    from reportlab.lib.pagesizes import A4
+    from reportlab.pdfbase import pdfmetrics
+    from reportlab.pdfbase.ttfonts import TTFont
+    from reportlab.pdfgen import canvas
+
+    font = 'Helvetica'
+    if os.path.exists(settings.SHOPPING_CART_PDF_FONT):
+        font = 'ShoppingCartFont'
+        pdfmetrics.registerFont(
+            TTFont(font, settings.SHOPPING_CART_PDF_FONT)
+        )
+    buffer = BytesIO()
+    page = canvas.Canvas(buffer, pagesize=A4)
+    _, height = A4
+    top, bottom, step = height - 50, 50, 18
+    y = top
+    page.setFont(font, 12)
+    for line in _text_lines(ingredients):
+        if y < bottom:
+            page.showPage()
+            page.setFont(font, 12)
+            y = top
+        page.drawString(50, y, line.rstrip('\n'))
+        y -= step
+    page.save()
+    yield buffer.getvalue()
+
+
+def _text_content(ingredients):
+    return _chunks(_text_lines(ingredients))
+
+
+def _csv_content(ingredients):
+    return _chunks(_csv_lines(ingredients))
+
+
+FORMATS = {
+    'txt': ('text/plain; charset=utf-8', _text_content),
+    'csv': ('text/csv; charset=utf-8', _csv_content),
+    'pdf': ('application/pdf', _pdf_content),
+}
+
+
+def shopping_cart(ingredients, file_format='txt'):
+    content_type, render = FORMATS[file_format]
+    response = StreamingHttpResponse(
+        render(ingredients.iterator(chunk_size=ROWS_PER_CHUNK)),
+        content_type=content_type,
+    )
+    name, _ = os.path.splitext(settings.DOWNLOADING_CART_NAME)
     response[
         'Content-Disposition'
-    ] = 'attachment; filename=shoping_cart.txt'
+    ] = f'attachment; filename={name}.{file_format}'
     return response
@@ -0,0 +1,82 @@
+from django.db.backends.signals import connection_created
+from django.db.models.signals import (m2m_changed, post_delete, post_save,
+                                      pre_delete)
+from django.dispatch import receiver
+
+from api.cache import (bump_catalog_version, invalidate_ingredients,
+                       invalidate_recipes)
+from api.metrics import instrument_connection
+from api.user_state import invalidate_user_state
+from recipes.models import (FavoriteRecipe, Ingredient, Recipe,
+                            RecipeIngredient, ShoppingCart)
+from tag.models import Tag
+from users.models import Follow
+
+
+@receiver(connection_created)
+def instrument_new_connection(sender, connection, **kwargs):
+    instrument_connection(connection)
+
+
+@receiver((post_save, post_delete), sender=Ingredient)
+def invalidate_ingredient(sender, **kwargs):
+    invalidate_ingredients()
+
+
+@receiver((post_save, post_delete), sender=Tag)
+def invalidate_tags(sender, **kwargs):
+    bump_catalog_version('tags')
+
+
+@receiver((post_save, post_delete), sender=FavoriteRecipe)
+def invalidate_favorites(sender, instance, **kwargs):
+    invalidate_user_state(instance.user_id, 'favorites')
+
+
+@receiver((post_save, post_delete), sender=ShoppingCart)
+def invalidate_shopping_cart(sender, instance, **kwargs):
+    invalidate_user_state(instance.user_id, 'shopping_cart')
+
+
+@receiver((post_save, post_delete), sender=Follow)
+def invalidate_following(sender, instance, **kwargs):
+    invalidate_user_state(instance.user_id, 'following')
+
+
+@receiver(post_save, sender=Recipe)
+def invalidate_recipe(sender, instance, **kwargs):
+    invalidate_recipes([instance.pk])
+
+
+@receiver(pre_delete, sender=Recipe)
+def invalidate_deleted_recipe(sender, instance, **kwargs):
+    # После удаления автора и теги рецепта уже не прочитать.
+    scopes = [f'recipe:{instance.pk}', f'author:{instance.author_id}']
+    scopes += [
+        f'tag:{slug}' for slug in instance.tags.values_list('slug', flat=True)
+    ]
+    invalidate_recipes([], scopes)
+
+
+@receiver((post_save, post_delete), sender=RecipeIngredient)
+def invalidate_recipe_ingredients(sender, instance, **kwargs):
+    invalidate_recipes([instance.recipe_id])
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def invalidate_recipe_tags(sender, instance, action, reverse, pk_set,
+                           **kwargs):
+    if action not in ('post_add', 'post_remove', 'pre_clear'):
+        return
+    if reverse:
+        if pk_set is None:
+            pk_set = instance.recipes.values_list('pk', flat=True)
+        invalidate_recipes(pk_set, [f'tag:{instance.slug}'])
+        return
+    if pk_set is None:
+        tags = instance.tags.all()
+    else:
+        tags = Tag.objects.filter(pk__in=pk_set)
+    invalidate_recipes([instance.pk], [
+        f'tag:{slug}' for slug in tags.values_list('slug', flat=True)
+    ])
@@ -0,0 +1,355 @@
+import asyncio
+import os
+import time
+from urllib.parse import urlencode
+
+from asgiref.testing import ApplicationCommunicator
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import FloatField
+from django.db.models.functions import Cast, Mod
+from django.http import HttpResponse, StreamingHttpResponse
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import path
+from rest_framework.authtoken.models import Token
+from rest_framework.request import Request
+from rest_framework.test import APIClient, APIRequestFactory
+
+from api import popularity
+from api.async_views import StreamingASGIHandler, async_read_view
+from api.metrics import metrics
+from api.pagination import SearchKeysetPaginator
+from recipes.models import (FavoriteRecipe, Ingredient, Recipe,
+                            RecipeIngredient, RecipePopularity, ShoppingCart)
+from tag.models import Tag
+from users.models import Follow, User
+
+MISSING = 10 ** 6
+SLOW_VIEW_SECONDS = 0.5
+
+
+def slow_view(request):
+    time.sleep(SLOW_VIEW_SECONDS)
+    return HttpResponse('ok')
+
+
+def stream_view(request):
+    return StreamingHttpResponse(['часть ' for _ in range(3)])
+
+
+urlpatterns = [
+    path('slow/', async_read_view(slow_view)),
+    path('stream/', async_read_view(stream_view)),
+]
+
+
+def create_recipes(author, count, tags, ingredients):
+    recipes = [
+        Recipe.objects.create(
+            author=author, name=f'Рецепт {author.pk}-{number}',
+            text='Описание', cooking_time=10, image='recipes/test.png',
+        )
+        for number in range(count)
+    ]
+    for recipe in recipes:
+        recipe.tags.set(tags)
+    RecipeIngredient.objects.bulk_create(
+        RecipeIngredient(recipe=recipe, ingredient=ingredient, amount=1)
+        for recipe in recipes
+        for ingredient in ingredients
+    )
+    return recipes
+
+
+class APITestCase(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            email='user@foodgram.local', username='user',
+            first_name='Имя', last_name='Фамилия', password='password',
+        )
+        cls.authors = [
+            User.objects.create_user(
+                email=f'author{number}@foodgram.local',
+                username=f'author{number}', first_name='Имя',
+                last_name='Фамилия', password='password',
+            )
+            for number in range(6)
+        ]
+        cls.tags = [
+            Tag.objects.create(
+                name=f'Тег {number}', color=f'#00000{number}',
+                slug=f'tag{number}',
+            )
+            for number in range(2)
+        ]
+        cls.ingredients = [
+            Ingredient.objects.create(
+                name=f'Ингредиент {number}', measurement_unit='г'
+            )
+            for number in range(3)
+        ]
+        for author in cls.authors:
+            create_recipes(author, 4, cls.tags, cls.ingredients)
+
+    def setUp(self):
+        # Ответы анонимным пользователям кэшируются.
+        cache.clear()
+        self.anonymous = APIClient()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def count_queries(self, client, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = client.get(url)
+        self.assertEqual(response.status_code, 200, response.data)
+        return len(queries)
+
+
+class RecipeListQueriesTest(APITestCase):
+    """Число запросов списка рецептов не зависит от размера страницы."""
+
+    def setUp(self):
+        super().setUp()
+        for recipe in Recipe.objects.all()[:10]:
+            FavoriteRecipe.objects.create(user=self.user, recipe=recipe)
+            ShoppingCart.objects.create(user=self.user, recipe=recipe)
+
+    def assert_constant(self, client, expected):
+        for limit in (2, 20):
+            cache.clear()
+            with self.subTest(limit=limit):
+                with self.assertNumQueries(expected):
+                    response = client.get(f'/api/recipes/?limit={limit}')
+                self.assertEqual(len(response.data['results']), limit)
+
+    def test_anonymous(self):
+        self.assert_constant(self.anonymous, 5)
+
+    def test_authenticated(self):
+        self.assert_constant(self.client, 5)
+
+
+class SubscriptionsQueriesTest(APITestCase):
+    """Число запросов подписок не зависит от числа авторов на странице."""
+
+    def subscriptions_queries(self, authors):
+        Follow.objects.filter(user=self.user).delete()
+        for author in self.authors[:authors]:
+            Follow.objects.create(user=self.user, author=author)
+        url = f'/api/users/subscriptions/?limit={authors}&recipes_limit=2'
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(len(response.data['results']), authors)
+        for author in response.data['results']:
+            self.assertEqual(len(author['recipes']), 2)
+        return len(queries)
+
+    def test_constant(self):
+        self.assertEqual(
+            self.subscriptions_queries(2), self.subscriptions_queries(6)
+        )
+
+    def test_count(self):
+        for author in self.authors:
+            Follow.objects.create(user=self.user, author=author)
+        with self.assertNumQueries(3):
+            self.client.get(
+                '/api/users/subscriptions/?limit=6&recipes_limit=2'
+            )
+
+
+class IngredientSearchTest(APITestCase):
+    """Поиск ингредиентов по названию."""
+
+    def test_list_limit(self):
+        with self.settings(INGREDIENT_SEARCH_LIMIT=2):
+            response = self.anonymous.get('/api/ingredients/?name=нгредиент')
+        self.assertEqual(len(response.data), 2)
+
+    def test_retrieve_with_name(self):
+        ingredient = self.ingredients[0]
+        response = self.anonymous.get(
+            f'/api/ingredients/{ingredient.pk}/?name=нгредиент'
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['id'], ingredient.pk)
+
+
+class SearchPaginationTest(APITestCase):
+    """Пагинация по ключу сохраняет порядок результатов поиска."""
+
+    def walk(self, url, paginate):
+        ids = []
+        while url:
+            page, url = paginate(url)
+            ids += page
+        return ids
+
+    def test_rank_cursor(self):
+        queryset = Recipe.objects.annotate(
+            rank=Cast(Mod('id', 3), FloatField())
+        ).order_by('-rank', '-pub_date', '-id')
+        factory = APIRequestFactory()
+
+        def paginate(url):
+            paginator = SearchKeysetPaginator()
+            page = paginator.paginate_queryset(
+                queryset, Request(factory.get(url))
+            )
+            return [recipe.pk for recipe in page], paginator.get_next_link()
+
+        self.assertEqual(
+            self.walk('/api/recipes/?cursor=&limit=5', paginate),
+            [recipe.pk for recipe in queryset],
+        )
+
+    def test_search_cursor(self):
+        def paginate(url):
+            response = self.anonymous.get(url)
+            self.assertEqual(response.status_code, 200, response.data)
+            return (
+                [recipe['id'] for recipe in response.data['results']],
+                response.data['next'],
+            )
+
+        self.assertEqual(
+            self.walk('/api/recipes/?' + urlencode(
+                {'search': 'писание', 'cursor': '', 'limit': 5}
+            ), paginate),
+            list(Recipe.objects.order_by('-pub_date', '-id')
+                 .values_list('id', flat=True)),
+        )
+
+
+class MetricsViewTest(APITestCase):
+    """Доступ к метрикам."""
+
+    url = '/api/metrics/'
+
+    def test_forbidden(self):
+        self.assertEqual(self.anonymous.get(self.url).status_code, 403)
+        self.assertEqual(self.client.get(self.url).status_code, 403)
+
+    def test_metrics_token(self):
+        with self.settings(METRICS_TOKEN='secret'):
+            response = self.anonymous.get(
+                self.url, HTTP_AUTHORIZATION='Bearer secret'
+            )
+            self.assertEqual(response.status_code, 200)
+            response = self.anonymous.get(
+                self.url, HTTP_AUTHORIZATION='Bearer wrong'
+            )
+            self.assertEqual(response.status_code, 403)
+
+    def test_staff_token(self):
+        staff = User.objects.create_user(
+            email='staff@foodgram.local', username='staff',
+            first_name='Имя', last_name='Фамилия', password='password',
+            is_staff=True,
+        )
+        token = Token.objects.create(user=staff)
+        response = self.anonymous.get(
+            self.url, HTTP_AUTHORIZATION=f'Token {token.key}'
+        )
+        self.assertEqual(response.status_code, 200)
+
+
+class BulkRelationTest(APITestCase):
+    """Пакетные изменения обновляют счётчики и популярность."""
+
+    def bulk(self, method, url, ids):
+        response = getattr(self.client, method)(
+            url, {'ids': ids}, format='json'
+        )
+        self.assertEqual(response.status_code, 200, response.data)
+        return [item['status'] for item in response.data['results']]
+
+    def test_favorites(self):
+        first, second = Recipe.objects.order_by('id')[:2]
+        url = '/api/recipes/favorite/'
+        self.assertEqual(
+            self.bulk('post', url, [first.pk, second.pk, MISSING]),
+            ['created', 'created', 'not_found'],
+        )
+        self.assertEqual(self.bulk('post', url, [first.pk]), ['exists'])
+        first.refresh_from_db()
+        self.assertEqual(first.favorites_count, 1)
+        self.assertEqual(popularity.refresh(), 2)
+        self.assertEqual(
+            set(RecipePopularity.objects.values_list('recipe', flat=True)),
+            {first.pk, second.pk},
+        )
+        self.assertEqual(
+            self.bulk('delete', url, [first.pk, MISSING]),
+            ['deleted', 'not_found'],
+        )
+        first.refresh_from_db()
+        self.assertEqual(first.favorites_count, 0)
+        self.assertFalse(
+            FavoriteRecipe.objects.filter(user=self.user, recipe=first)
+            .exists()
+        )
+        popularity.refresh(full=True)
+        self.assertEqual(
+            list(RecipePopularity.objects.values_list('recipe', flat=True)),
+            [second.pk],
+        )
+
+    def test_subscriptions(self):
+        author = self.authors[0]
+        url = '/api/users/subscribe/'
+        self.assertEqual(
+            self.bulk('post', url, [author.pk, self.user.pk]),
+            ['created', 'invalid'],
+        )
+        author.refresh_from_db()
+        self.assertEqual(author.followers_count, 1)
+        self.assertEqual(self.bulk('delete', url, [author.pk]), ['deleted'])
+        author.refresh_from_db()
+        self.assertEqual(author.followers_count, 0)
+        self.assertFalse(Follow.objects.filter(user=self.user).exists())
+
+
+@override_settings(ROOT_URLCONF='api.tests')
+class ASGIConcurrencyTest(SimpleTestCase):
+    """Под ASGI middleware не выполняет запросы чтения по очереди."""
+
+    async def get(self, application, url):
+        communicator = ApplicationCommunicator(application, {
+            'type': 'http', 'method': 'GET', 'path': url,
+            'query_string': b'', 'headers': [(b'host', b'testserver')],
+        })
+        await communicator.send_input({'type': 'http.request'})
+        start = await communicator.receive_output(5)
+        body = b''
+        while True:
+            message = await communicator.receive_output(5)
+            body += message.get('body', b'')
+            if not message.get('more_body'):
+                return start['status'], body
+
+    async def get_concurrently(self, url, count):
+        application = StreamingASGIHandler()
+        return await asyncio.gather(*(
+            self.get(application, url) for _ in range(count)
+        ))
+
+    def test_slow_reads_overlap(self):
+        started = time.monotonic()
+        responses = asyncio.run(self.get_concurrently('/slow/', 2))
+        elapsed = time.monotonic() - started
+        self.assertEqual(responses, [(200, b'ok'), (200, b'ok')])
+        self.assertLess(elapsed, SLOW_VIEW_SECONDS * 1.8)
+
+    def test_streaming_response_metrics(self):
+        [(status, body)] = asyncio.run(self.get_concurrently('/stream/', 1))
+        self.assertEqual(status, 200)
+        self.assertEqual(body.decode(), 'часть ' * 3)
+        self.assertIn(
+            'foodgram_response_bytes_total{view="api.tests.stream_view",'
+            f'pid="{os.getpid()}"}} {len(body)}',
+            metrics.render(),
+        )
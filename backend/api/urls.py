@@ -1,7 +1,10 @@
+from django.conf import settings
 from django.urls import include, path
 from rest_framework.routers import DefaultRouter
 
-from .views import IngredientViewSet, RecipeViewSet, TagViewSet, UserViewSet
+from .async_views import async_read_urls
+from .views import (IngredientViewSet, RecipeViewSet, TagViewSet, UserViewSet,
+                    metrics_view)
 
 app_name = 'api'
 
@@ -11,8 +14,13 @@ router.register('tags', TagViewSet, basename='tags')
 router.register('ingredients', IngredientViewSet, basename='ingredients')
 router.register('recipes', RecipeViewSet, basename='recipes')
 
+router_urls = router.urls
+if settings.ASYNC_READ_VIEWS:
+    router_urls = async_read_urls(router_urls)
+
 urlpatterns = [
-    path('', include(router.urls)),
+    path('metrics/', metrics_view, name='metrics'),
+    path('', include(router_urls)),
     path('', include('djoser.urls')),
     path('auth/', include('djoser.urls.authtoken')),
 ]
@@ -0,0 +1,84 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from recipes.models import FavoriteRecipe, ShoppingCart
+from users.models import Follow
+
+STATES = {
+    'favorites': (FavoriteRecipe, 'recipe_id'),
+    'shopping_cart': (ShoppingCart, 'recipe_id'),
+    'following': (Follow, 'author_id'),
+}
+
+
+def state_key(user_id, name):
+    return f'user-state:{user_id}:{name}'
+
+
+class UserState:
+    """
+    Избранное, корзина и подписки пользователя в виде множеств id.
+
+    Каждое множество загружается одним запросом при первом обращении
+    и живёт до конца запроса, а при USER_STATE_CACHE_TIMEOUT > 0 ещё
+    и в общем кэше.
+    """
+
+    def __init__(self, user):
+        self.user_id = None if user.is_anonymous else user.id
+        self._sets = {}
+
+    def get(self, name):
+        if self.user_id is None:
+            return frozenset()
+        if name not in self._sets:
+            self._sets[name] = self.load(name)
+        return self._sets[name]
+
+    def load(self, name):
+        timeout = settings.USER_STATE_CACHE_TIMEOUT
+        key = state_key(self.user_id, name)
+        if timeout:
+            ids = cache.get(key)
+            if ids is not None:
+                return ids
+        model, field = STATES[name]
+        ids = frozenset(
+            model.objects.filter(user_id=self.user_id)
+            .values_list(field, flat=True)
+        )
+        if timeout:
+            cache.set(key, ids, timeout)
+        return ids
+
+    @property
+    def favorites(self):
+        return self.get('favorites')
+
+    @property
+    def shopping_cart(self):
+        return self.get('shopping_cart')
+
+    @property
+    def following(self):
+        return self.get('following')
+
+
+def get_user_state(request):
+    """Состояние пользователя, общее для всех сериализаторов запроса."""
+    if not hasattr(request, '_user_state'):
+        request._user_state = UserState(request.user)
+    return request._user_state
+
+
+def clear_user_state(user_id):
+    cache.delete_many([state_key(user_id, name) for name in STATES])
+
+
+def invalidate_user_state(user_id, name):
+    """Сбрасывает закэшированное множество после коммита транзакции."""
+    if settings.USER_STATE_CACHE_TIMEOUT:
+        transaction.on_commit(
+            lambda: cache.delete(state_key(user_id, name))
+        )
@@ -1,31 +1,61 @@
+import hmac
+from collections import defaultdict
+from functools import partial
+
+from django.conf import settings
+from django.db import transaction
 from django.db.models import Sum
+from django.http import HttpResponse, HttpResponseForbidden
 from django.shortcuts import get_object_or_404
 from django_filters.rest_framework import DjangoFilterBackend
 from djoser.views import UserViewSet
 from rest_framework import status, viewsets
+from rest_framework.authentication import TokenAuthentication
 from rest_framework.decorators import action
+from rest_framework.exceptions import AuthenticationFailed
 from rest_framework.permissions import SAFE_METHODS, IsAuthenticated
 from rest_framework.response import Response
 
-from api.filters import NameFilter, RecipeFilter
-from api.pagination import LimitPagesPaginator
+from api import bulk
+from api.cache import (cache_anonymous_recipes, catalog_snapshot,
+                       catalog_version, conditional_catalog,
+                       ingredient_search_cache)
+from api.filters import NameFilter, RecipeFilter, normalize_name
+from api.metrics import SerializerTimingMixin, metrics, profile_serializer
+from api.pagination import (FeedPaginator, KeysetPaginationMixin,
+                            KeysetPaginator, LimitPagesPaginator,
+                            PopularKeysetPaginator, SearchKeysetPaginator,
+                            UserKeysetPaginator)
 from api.permissions import IsAdminOrReadOnly, IsAuthorOrReadOnly
-from api.serializers import (AddRecipeSerializer, FollowSerializer,
-                             IngredientSerializer, ShortRecipeSerializer,
-                             ShowRecipeSerializer, TagSerializer,
-                             UserSerializer)
-from api.shopping_cart import shopping_cart
+from api.serializers import (AddRecipeSerializer, BulkIdsSerializer,
+                             FollowSerializer, IngredientSerializer,
+                             ShortRecipeSerializer, ShowRecipeSerializer,
+                             TagSerializer, UserSerializer, get_recipes_limit)
+from api.shopping_cart import FORMATS, shopping_cart
 from recipes.models import (FavoriteRecipe, Ingredient, Recipe,
                             RecipeIngredient, ShoppingCart)
 from tag.models import Tag
 from users.models import Follow, User
 
 
-class UserViewSet(UserViewSet):
+def bulk_response(relation, request):
+    """Пакетное добавление или удаление со статусом каждого id."""
+    serializer = BulkIdsSerializer(data=request.data)
+    serializer.is_valid(raise_exception=True)
+    return Response({'results': relation.apply(
+        request.method, request.user, serializer.validated_data['ids']
+    )})
+
+
+class UserViewSet(SerializerTimingMixin, KeysetPaginationMixin, UserViewSet):
     """Вьюсет пользователя."""
     queryset = User.objects.all()
     serializer_class = UserSerializer
     pagination_class = LimitPagesPaginator
+    keyset_pagination_class = UserKeysetPaginator
+
+    def get_queryset(self):
+        return super().get_queryset().with_is_subscribed(self.request.user)
 
     @action(
         detail=False,
@@ -46,9 +76,19 @@ class UserViewSet(UserViewSet):
         user = request.user
         queryset = User.objects.filter(following__user=user)
         page = self.paginate_queryset(queryset)
-        serializer = FollowSerializer(
+        latest_recipes = defaultdict(list)
+        for recipe in Recipe.objects.only(
+            'id', 'name', 'image', 'image_renditions', 'cooking_time',
+            'author', 'pub_date',
+        ).latest_for_authors(
+            [author.id for author in page], get_recipes_limit(request)
+        ):
+            latest_recipes[recipe.author_id].append(recipe)
+        for author in page:
+            author.latest_recipes = latest_recipes[author.id]
+        serializer = profile_serializer(FollowSerializer(
             page, many=True, context={'request': request}
-        )
+        ))
         return self.get_paginated_response(serializer.data)
 
     @action(
@@ -56,6 +96,7 @@ class UserViewSet(UserViewSet):
         methods=('post', 'delete'),
         permission_classes=(IsAuthenticated,)
     )
+    @transaction.atomic
     def subscribe(self, request, id):
         user = request.user
         author = get_object_or_404(User, id=id)
@@ -76,8 +117,18 @@ class UserViewSet(UserViewSet):
             status=status.HTTP_204_NO_CONTENT,
         )
 
+    @action(
+        detail=False,
+        methods=('post', 'delete'),
+        url_path='subscribe',
+        url_name='bulk-subscribe',
+        permission_classes=(IsAuthenticated,)
+    )
+    def bulk_subscribe(self, request):
+        return bulk_response(bulk.subscriptions, request)
+
 
-class TagViewSet(viewsets.ModelViewSet):
+class TagViewSet(SerializerTimingMixin, viewsets.ModelViewSet):
     """Вьюсет тэгов к рецептам."""
 
     queryset = Tag.objects.all()
@@ -85,19 +136,57 @@ class TagViewSet(viewsets.ModelViewSet):
     permission_classes = (IsAdminOrReadOnly,)
     pagination_class = None
 
+    @conditional_catalog('tags')
+    def list(self, request, *args, **kwargs):
+        return Response(catalog_snapshot(
+            'tags', partial(super().list, request, *args, **kwargs)
+        ))
+
+    @conditional_catalog('tags')
+    def retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
 
-class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
+
+class IngredientViewSet(SerializerTimingMixin, viewsets.ReadOnlyModelViewSet):
     """Вьюсет ингредиентов."""
 
     queryset = Ingredient.objects.all()
     serializer_class = IngredientSerializer
     permission_classes = (IsAdminOrReadOnly,)
     filter_backends = (NameFilter,)
-    search_fields = ('^name',)
     pagination_class = None
+    # Ограничение выдачи поиска по названию, только для list.
+    search_limit = None
+
+    @conditional_catalog('ingredients')
+    def list(self, request, *args, **kwargs):
+        build = partial(super().list, request, *args, **kwargs)
+        name = normalize_name(
+            request.query_params.get(NameFilter.search_param, '')
+        )
+        if not name:
+            return Response(catalog_snapshot('ingredients', build))
+        self.search_limit = settings.INGREDIENT_SEARCH_LIMIT
+        key = (catalog_version('ingredients'), name)
+        data = ingredient_search_cache.get(key)
+        if data is None:
+            data = build().data
+            ingredient_search_cache.set(key, data)
+        return Response(data)
 
+    @conditional_catalog('ingredients')
+    def retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
 
-class RecipeViewSet(viewsets.ModelViewSet):
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        if self.search_limit is not None:
+            return queryset[:self.search_limit]
+        return queryset
+
+
+class RecipeViewSet(SerializerTimingMixin, KeysetPaginationMixin,
+                    viewsets.ModelViewSet):
     """Вьюсет рецептов."""
 
     queryset = Recipe.objects.all()
@@ -106,11 +195,44 @@ class RecipeViewSet(viewsets.ModelViewSet):
     filter_backends = (DjangoFilterBackend,)
     filterset_class = RecipeFilter
 
+    def get_queryset(self):
+        if self.request.method in SAFE_METHODS:
+            return Recipe.objects.for_display(self.request.user)
+        return Recipe.objects.all()
+
     def get_serializer_class(self):
         if self.request.method in SAFE_METHODS:
             return ShowRecipeSerializer
         return AddRecipeSerializer
 
+    @property
+    def keyset_pagination_class(self):
+        if self.request.query_params.get('ordering') == 'popular':
+            return PopularKeysetPaginator
+        if self.request.query_params.get('search', '').strip():
+            return SearchKeysetPaginator
+        return KeysetPaginator
+
+    @cache_anonymous_recipes
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+
+    @cache_anonymous_recipes
+    def retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
+
+    @action(
+        methods=('get',),
+        detail=False,
+        permission_classes=(IsAuthenticated,),
+    )
+    def feed(self, request):
+        paginator = FeedPaginator()
+        page = paginator.paginate_queryset(self.get_queryset(), request, self)
+        serializer = self.get_serializer(page, many=True)
+        return paginator.get_paginated_response(serializer.data)
+
+    @transaction.atomic
     def add_or_delete(self, model, where, request, user, pk):
         recipe = get_object_or_404(Recipe, pk=pk)
         obj = model.objects.filter(user=user, recipe=recipe)
@@ -143,12 +265,38 @@ class RecipeViewSet(viewsets.ModelViewSet):
         where = 'в списке покупок'
         return self.add_or_delete(ShoppingCart, where, request, user, pk)
 
+    @action(
+        methods=('post', 'delete'),
+        detail=False,
+        url_path='favorite',
+        url_name='bulk-favorite',
+        permission_classes=(IsAuthenticated,),
+    )
+    def bulk_favorite(self, request):
+        return bulk_response(bulk.favorites, request)
+
+    @action(
+        methods=('post', 'delete'),
+        detail=False,
+        url_path='shopping_cart',
+        url_name='bulk-shopping-cart',
+        permission_classes=(IsAuthenticated,),
+    )
+    def bulk_shopping_cart(self, request):
+        return bulk_response(bulk.shopping_cart, request)
+
     @action(
         methods=('get',),
         detail=False,
         permission_classes=(IsAuthenticated,),
     )
     def download_shopping_cart(self, request):
+        file_format = request.query_params.get('filetype', 'txt')
+        if file_format not in FORMATS:
+            return Response(
+                {'errors': f'Доступные форматы: {", ".join(FORMATS)}'},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
         ingredients = (
             RecipeIngredient.objects.filter(
                 recipe__shopping_cart__user=request.user
@@ -158,5 +306,32 @@ class RecipeViewSet(viewsets.ModelViewSet):
                 'ingredient__measurement_unit',
             )
             .annotate(sum_ingredients=Sum('amount'))
+            .order_by('ingredient__name', 'ingredient__measurement_unit')
         )
-        return shopping_cart(ingredients)
+        return shopping_cart(ingredients, file_format)
+
+
+def is_staff_request(request):
+    """Администратор по сессии админки или по токену API."""
+    if request.user.is_staff:
+        return True
+    try:
+        user_auth = TokenAuthentication().authenticate(request)
+    except AuthenticationFailed:
+        return False
+    return user_auth is not None and user_auth[0].is_staff
+
+
+def metrics_view(request):
+    """Метрики производительности для Prometheus."""
+    token = settings.METRICS_TOKEN
+    authorized = bool(token) and hmac.compare_digest(
+        request.META.get('HTTP_AUTHORIZATION', '').encode(),
+        f'Bearer {token}'.encode(),
+    )
+    if not authorized and not is_staff_request(request):
+        return HttpResponseForbidden()
+    return HttpResponse(
+        metrics.render(),
+        content_type='text/plain; version=0.0.4; charset=utf-8',
+    )
@@ -1,7 +1,12 @@
 import os
 
-from django.core.asgi import get_asgi_application
+import django
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
+os.environ.setdefault('ASYNC_READ_VIEWS', 'True')
 
-application = get_asgi_application()
+django.setup(set_prefix=False)
+
+from api.async_views import StreamingASGIHandler  # noqa: E402
+
+application = StreamingASGIHandler()
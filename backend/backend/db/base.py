@@ -0,0 +1,31 @@
+from django.db.backends.postgresql import base
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    """
+    PostgreSQL с проверкой постоянных соединений перед повторным
+    использованием, как CONN_HEALTH_CHECKS в Django 4.1.
+
+    Соединение проверяется один раз за запрос, при первом обращении
+    к БД, поэтому запросы без обращения к БД ничего не платят.
+    """
+
+    health_check_needed = False
+
+    def close_if_unusable_or_obsolete(self):
+        super().close_if_unusable_or_obsolete()
+        if self.connection is not None and self.settings_dict.get(
+            'CONN_HEALTH_CHECKS'
+        ):
+            self.health_check_needed = True
+
+    def ensure_connection(self):
+        if self.health_check_needed:
+            self.health_check_needed = False
+            if (
+                self.connection is not None
+                and not self.in_atomic_block
+                and not self.is_usable()
+            ):
+                self.close()
+        super().ensure_connection()
@@ -0,0 +1,143 @@
+import asyncio
+import random
+import time
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DatabaseError, connections
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+# Разрешено ли читать с реплик в текущем запросе. Вне запросов
+# (команды, фоновые задачи) всё читается с основной БД.
+read_from_replica = ContextVar('read_from_replica', default=False)
+
+LAG_QUERIES = {
+    'postgresql': (
+        'SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn()'
+        ' THEN 0 ELSE EXTRACT(EPOCH FROM now() - '
+        'pg_last_xact_replay_timestamp()) END'
+    ),
+}
+
+lag_checked = {}
+
+
+def replicas():
+    return [alias for alias in settings.DATABASES if alias.startswith(
+        'replica_'
+    )]
+
+
+def replica_lag(alias):
+    """Отставание реплики в секундах, None — реплика недоступна."""
+    connection = connections[alias]
+    query = LAG_QUERIES.get(connection.vendor)
+    if query is None:
+        return 0
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(query)
+            lag = cursor.fetchone()[0]
+    except DatabaseError:
+        return None
+    return float(lag or 0)
+
+
+def is_replica_fresh(alias):
+    """
+    Реплика не отстаёт больше REPLICA_MAX_LAG секунд.
+
+    Результат проверки живёт REPLICA_LAG_CHECK_INTERVAL секунд
+    в памяти процесса.
+    """
+    checked_at, fresh = lag_checked.get(alias, (0, True))
+    if time.monotonic() - checked_at > settings.REPLICA_LAG_CHECK_INTERVAL:
+        lag = replica_lag(alias)
+        fresh = lag is not None and lag <= settings.REPLICA_MAX_LAG
+        lag_checked[alias] = (time.monotonic(), fresh)
+    return fresh
+
+
+class ReplicaRouter:
+    """
+    Чтение безопасных запросов API с реплик, всё остальное — с основной БД.
+    """
+
+    def db_for_read(self, model, **hints):
+        if not read_from_replica.get():
+            return None
+        if connections['default'].in_atomic_block:
+            return None
+        fresh = [alias for alias in replicas() if is_replica_fresh(alias)]
+        if not fresh:
+            return None
+        return random.choice(fresh)
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == 'default'
+
+
+class ReplicaRoutingMiddleware:
+    """
+    Разрешает чтение с реплик для GET/HEAD/OPTIONS.
+
+    После изменяющего запроса клиент REPLICA_STICKY_SECONDS секунд
+    читает с основной БД и видит свои изменения. Привязка хранится
+    в cookie клиента, а не в кэше: так её видят все воркеры.
+    Под ASGI работает асинхронно, не занимая общий поток Django.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if asyncio.iscoroutinefunction(get_response):
+            # Как в MiddlewareMixin: Django вызовет __call__ через await.
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        if not replicas():
+            return self.get_response(request)
+        token = read_from_replica.set(self.replica_allowed(request))
+        try:
+            response = self.get_response(request)
+        finally:
+            read_from_replica.reset(token)
+        return self.pin_to_primary(request, response)
+
+    async def __acall__(self, request):
+        if not replicas():
+            return await self.get_response(request)
+        token = read_from_replica.set(self.replica_allowed(request))
+        try:
+            response = await self.get_response(request)
+        finally:
+            read_from_replica.reset(token)
+        return self.pin_to_primary(request, response)
+
+    @staticmethod
+    def replica_allowed(request):
+        return (
+            request.method in SAFE_METHODS
+            and settings.REPLICA_STICKY_COOKIE not in request.COOKIES
+        )
+
+    @staticmethod
+    def pin_to_primary(request, response):
+        if request.method not in SAFE_METHODS:
+            response.set_cookie(
+                settings.REPLICA_STICKY_COOKIE, '1',
+                max_age=settings.REPLICA_STICKY_SECONDS,
+                httponly=True, samesite='Lax',
+            )
+        return response
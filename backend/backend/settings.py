@@ -1,4 +1,5 @@
 import os
+import warnings
 from pathlib import Path
 
 from dotenv import load_dotenv
@@ -65,6 +66,7 @@ DJOSER = {
 AUTH_USER_MODEL = 'users.User'
 
 MIDDLEWARE = [
+    'api.middleware.PerformanceMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -72,6 +74,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'backend.db.replicas.ReplicaRoutingMiddleware',
 ]
 
 ROOT_URLCONF = 'backend.urls'
@@ -95,19 +98,67 @@ TEMPLATES = [
 WSGI_APPLICATION = 'backend.wsgi.application'
 
 
+DB_ENGINE = os.getenv('DB_ENGINE', default='backend.db')
+
 DATABASES = {
     'default': {
         # 'ENGINE': 'django.db.backends.sqlite3',
         # 'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
-        'ENGINE': os.getenv('DB_ENGINE', default='django.db.backends.postgresql'),
+        'ENGINE': DB_ENGINE,
         'NAME': os.getenv('DB_NAME', default='postgres'),
         'USER': os.getenv('POSTGRES_USER', default='postgres'),
         'PASSWORD': os.getenv('POSTGRES_PASSWORD', default='postgres'),
         'HOST': os.getenv('DB_HOST', default='db'),
-        'PORT': os.getenv('DB_PORT', default=5432)
+        'PORT': os.getenv('DB_PORT', default=5432),
+        # Время жизни соединения в секундах, 0 — новое на каждый запрос.
+        'CONN_MAX_AGE': int(os.getenv('DB_CONN_MAX_AGE', default=60)),
+        # Проверку соединений умеет только движок backend.db.
+        'CONN_HEALTH_CHECKS': os.getenv(
+            'DB_CONN_HEALTH_CHECKS', default=str(DB_ENGINE == 'backend.db')
+        ) == 'True',
+        # pgbouncer в режиме transaction не поддерживает серверные курсоры.
+        'DISABLE_SERVER_SIDE_CURSORS': os.getenv(
+            'DB_DISABLE_SERVER_SIDE_CURSORS', default=''
+        ) == 'True',
+    }
+}
+if DATABASES['default']['CONN_HEALTH_CHECKS'] and DB_ENGINE != 'backend.db':
+    warnings.warn(
+        f'DB_CONN_HEALTH_CHECKS не действует с DB_ENGINE={DB_ENGINE}: '
+        'соединения проверяет только движок backend.db'
+    )
+
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv(
+            'CACHE_BACKEND',
+            default='django.core.cache.backends.locmem.LocMemCache',
+        ),
+        'LOCATION': os.getenv('CACHE_LOCATION', default='foodgram'),
     }
 }
 
+CATALOG_CACHE_TIMEOUT = int(os.getenv('CATALOG_CACHE_TIMEOUT', default=300))
+
+
+# Реплики для чтения через запятую: хосты PostgreSQL
+# или, для локальной проверки на SQLite, пути к файлам БД.
+for number, replica in enumerate(
+    filter(None, os.getenv('DB_REPLICAS', default='').split(',')), 1
+):
+    DATABASES[f'replica_{number}'] = {
+        **DATABASES['default'],
+        'NAME' if 'sqlite' in DATABASES['default']['ENGINE'] else 'HOST':
+            replica.strip(),
+        'TEST': {'MIRROR': 'default'},
+    }
+
+DATABASE_ROUTERS = ('backend.db.replicas.ReplicaRouter',)
+
+REPLICA_STICKY_SECONDS = int(os.getenv('REPLICA_STICKY_SECONDS', default=10))
+REPLICA_STICKY_COOKIE = 'db_primary'
+REPLICA_MAX_LAG = float(os.getenv('REPLICA_MAX_LAG', default=5))
+REPLICA_LAG_CHECK_INTERVAL = 5
 
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -137,3 +188,61 @@ USE_TZ = True
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 DOWNLOADING_CART_NAME = "shopping-list.txt"
+
+SEARCH_CONFIG = os.getenv('SEARCH_CONFIG', default='russian')
+
+INGREDIENT_SEARCH_LIMIT = int(os.getenv('INGREDIENT_SEARCH_LIMIT', default=20))
+INGREDIENT_SEARCH_CACHE_SIZE = 1024
+INGREDIENT_SEARCH_CACHE_TIMEOUT = 300
+
+SHOPPING_CART_PDF_FONT = os.getenv(
+    'SHOPPING_CART_PDF_FONT',
+    default='/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf',
+)
+
+IMAGE_WORKERS = int(os.getenv('IMAGE_WORKERS', default=2))
+IMAGE_PROCESSING_TIMEOUT = int(os.getenv('IMAGE_PROCESSING_TIMEOUT', default=10))
+IMAGE_MAX_SIZE = int(os.getenv('IMAGE_MAX_SIZE', default=10 * 1024 * 1024))
+IMAGE_RENDITION_QUALITY = 80
+IMAGE_RENDITIONS = {
+    'thumbnail': (320, 320),
+    'card': (640, 640),
+    'full': (1280, 1280),
+}
+
+# 0 — состояние пользователя кэшируется только в пределах запроса.
+USER_STATE_CACHE_TIMEOUT = int(os.getenv('USER_STATE_CACHE_TIMEOUT', default=0))
+
+RECIPE_CACHE_TIMEOUT = int(os.getenv('RECIPE_CACHE_TIMEOUT', default=60))
+
+# Сколько id можно передать в пакетный запрос избранного, покупок
+# или подписок.
+BULK_MAX_ITEMS = 100
+
+# Вклад добавления в популярность рецепта уменьшается вдвое
+# за POPULARITY_HALF_LIFE_DAYS дней.
+POPULARITY_HALF_LIFE_DAYS = float(
+    os.getenv('POPULARITY_HALF_LIFE_DAYS', default=7)
+)
+POPULARITY_WEIGHTS = {
+    'favorites': 1.0,
+    'shopping_cart': 0.5,
+}
+
+# Рецепты авторов с большим числом подписчиков не рассылаются по лентам,
+# а читаются в ленту напрямую.
+FEED_FANOUT_LIMIT = int(os.getenv('FEED_FANOUT_LIMIT', default=10000))
+# Сколько последних рецептов автора попадает в ленту при подписке.
+FEED_BACKFILL = 50
+# Сколько авторов без рассылки, самых популярных, читается в ленту.
+FEED_MAX_CELEBRITIES = 50
+
+# Включается в backend/asgi.py: под ASGI чтение рецептов, тегов
+# и ингредиентов выполняется параллельно в пуле потоков.
+ASYNC_READ_VIEWS = os.getenv('ASYNC_READ_VIEWS', default='') == 'True'
+ASYNC_VIEW_THREADS = int(os.getenv('ASYNC_VIEW_THREADS', default=20))
+
+# Запросы, сделавшие больше SQL-запросов, попадают в лог; 0 — без проверки.
+QUERY_BUDGET = int(os.getenv('QUERY_BUDGET', default=0))
+# Токен Prometheus для /api/metrics/, без него метрики видны только staff.
+METRICS_TOKEN = os.getenv('METRICS_TOKEN', default='')
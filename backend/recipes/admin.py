@@ -2,6 +2,7 @@ from django.contrib import admin
 
 from .models import (FavoriteRecipe, Ingredient, Recipe, RecipeIngredient,
                      ShoppingCart)
+from api.images import schedule_renditions
 
 
 @admin.register(Ingredient,)
@@ -12,8 +13,20 @@ class IngredientAdmin(admin.ModelAdmin):
 
 @admin.register(Recipe,)
 class RecipeAdmin(admin.ModelAdmin):
-    list_display = ('name', 'author')
+    list_display = ('name', 'author', 'favorites_count')
     list_filter = ('author', 'name', 'tags')
+    readonly_fields = ('favorites_count',)
+
+    def save_model(self, request, obj, form, change):
+        if 'image' in form.changed_data:
+            obj.image_renditions = {}
+        super().save_model(request, obj, form, change)
+        if 'image' in form.changed_data:
+            schedule_renditions(obj)
+
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        Recipe.objects.filter(pk=form.instance.pk).update_search_vector()
 
 
 @admin.register(RecipeIngredient)
@@ -25,6 +38,14 @@ class RecipeIngredientsAdmin(admin.ModelAdmin):
         'amount',
     )
 
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        Recipe.objects.filter(pk=obj.recipe_id).update_search_vector()
+
+    def delete_model(self, request, obj):
+        super().delete_model(request, obj)
+        Recipe.objects.filter(pk=obj.recipe_id).update_search_vector()
+
 
 @admin.register(FavoriteRecipe)
 class FavoriteRecipeAdmin(admin.ModelAdmin):
@@ -32,6 +53,7 @@ class FavoriteRecipeAdmin(admin.ModelAdmin):
         'id',
         'user',
         'recipe',
+        'created',
     )
 
 
@@ -41,4 +63,5 @@ class ShoppingCartAdmin(admin.ModelAdmin):
         'id',
         'user',
         'recipe',
+        'created',
     )
@@ -3,3 +3,6 @@ from django.apps import AppConfig
 
 class RecipeConfig(AppConfig):
     name = 'recipes'
+
+    def ready(self):
+        from recipes import signals  # noqa: F401
@@ -0,0 +1,133 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+
+from django.conf import settings
+from django.db import connection, transaction
+
+from recipes.models import FeedEntry, Recipe
+from users.models import Follow, User
+
+BATCH_SIZE = 5000
+AUTHORS_BATCH_SIZE = 100
+
+logger = logging.getLogger(__name__)
+
+# Рассылка идёт по одной, чтобы не нагружать БД параллельными вставками.
+executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='feed')
+
+
+def save_entries(entries):
+    """Запись пачками, не собирая все записи в памяти."""
+    entries = iter(entries)
+    total = 0
+    while True:
+        batch = list(islice(entries, BATCH_SIZE))
+        if not batch:
+            return total
+        FeedEntry.objects.bulk_create(batch, ignore_conflicts=True)
+        total += len(batch)
+
+
+def fans_out(followers_count):
+    return followers_count <= settings.FEED_FANOUT_LIMIT
+
+
+def celebrity_authors(user):
+    """
+    Авторы из подписок, чьи рецепты читаются в ленту напрямую,
+    не больше FEED_MAX_CELEBRITIES самых популярных.
+    """
+    return list(Follow.objects.filter(
+        user=user, author__followers_count__gt=settings.FEED_FANOUT_LIMIT
+    ).order_by('-author__followers_count', 'author_id').values_list(
+        'author_id', flat=True
+    )[:settings.FEED_MAX_CELEBRITIES])
+
+
+def fan_out(recipe_id):
+    """Добавляет рецепт в ленты подписчиков автора."""
+    recipe = Recipe.objects.select_related('author').only(
+        'pub_date', 'author', 'author__followers_count'
+    ).filter(pk=recipe_id).first()
+    if recipe is None or not fans_out(recipe.author.followers_count):
+        return 0
+    return save_entries(
+        FeedEntry(user_id=user_id, recipe_id=recipe_id,
+                  pub_date=recipe.pub_date)
+        for user_id in Follow.objects.filter(
+            author_id=recipe.author_id
+        ).values_list('user_id', flat=True).iterator()
+    )
+
+
+def run_fan_out(recipe_id):
+    try:
+        fan_out(recipe_id)
+    except Exception:
+        logger.exception('Не удалось разослать рецепт %s по лентам',
+                         recipe_id)
+    finally:
+        connection.close()
+
+
+def schedule_fan_out(recipe_id):
+    """
+    Рассылка рецепта в фоновом потоке после коммита транзакции.
+
+    Запрос автора не ждёт вставки записей для всех подписчиков.
+    Рассылки, прерванные перезапуском, восстанавливает rebuild_feed.
+    """
+    transaction.on_commit(lambda: executor.submit(run_fan_out, recipe_id))
+
+
+def backfill(user_id, author_ids):
+    """Последние рецепты авторов в ленту нового подписчика."""
+    authors = list(User.objects.filter(
+        pk__in=author_ids, followers_count__lte=settings.FEED_FANOUT_LIMIT
+    ).values_list('id', flat=True))
+    save_entries(
+        FeedEntry(user_id=user_id, recipe_id=recipe.id,
+                  pub_date=recipe.pub_date)
+        for recipe in Recipe.objects.only(
+            'id', 'author', 'pub_date'
+        ).latest_for_authors(authors, settings.FEED_BACKFILL)
+    )
+
+
+def remove(user_id, author_ids):
+    FeedEntry.objects.filter(
+        user_id=user_id, recipe__author_id__in=author_ids
+    ).delete()
+
+
+@transaction.atomic
+def rebuild(log=None):
+    """
+    Заново строит ленты по подпискам: последние FEED_BACKFILL
+    рецептов каждого автора, кроме авторов без рассылки.
+    """
+    log = log or (lambda message: None)
+    FeedEntry.objects.all().delete()
+    authors = list(User.objects.filter(
+        followers_count__gt=0,
+        followers_count__lte=settings.FEED_FANOUT_LIMIT,
+    ).order_by('id').values_list('id', flat=True))
+    total = 0
+    for start in range(0, len(authors), AUTHORS_BATCH_SIZE):
+        batch = authors[start:start + AUTHORS_BATCH_SIZE]
+        recipes = {}
+        for recipe in Recipe.objects.only(
+            'id', 'author', 'pub_date'
+        ).latest_for_authors(batch, settings.FEED_BACKFILL):
+            recipes.setdefault(recipe.author_id, []).append(recipe)
+        total += save_entries(
+            FeedEntry(user_id=user_id, recipe_id=recipe.id,
+                      pub_date=recipe.pub_date)
+            for user_id, author_id in Follow.objects.filter(
+                author_id__in=batch
+            ).values_list('user_id', 'author_id').iterator()
+            for recipe in recipes.get(author_id, ())
+        )
+        log(f'Записей ленты: {total}')
+    return total
@@ -0,0 +1,46 @@
+# Generated by Django 3.2.15 on 2026-10-18 17:06
+
+from django.db import migrations
+from django.db.models import Count, Min
+
+
+def merge_duplicate_ingredients(apps, schema_editor):
+    """Повторный запуск старого импорта создавал дубли ингредиентов."""
+    Ingredient = apps.get_model('recipes', 'Ingredient')
+    RecipeIngredient = apps.get_model('recipes', 'RecipeIngredient')
+    duplicates = (
+        Ingredient.objects.values('name', 'measurement_unit')
+        .annotate(keep_id=Min('id'), total=Count('id'))
+        .filter(total__gt=1)
+        .order_by()
+    )
+    for duplicate in duplicates:
+        extra = Ingredient.objects.filter(
+            name=duplicate['name'],
+            measurement_unit=duplicate['measurement_unit'],
+        ).exclude(id=duplicate['keep_id'])
+        for row in RecipeIngredient.objects.filter(ingredient__in=extra):
+            kept = RecipeIngredient.objects.filter(
+                recipe_id=row.recipe_id, ingredient_id=duplicate['keep_id']
+            ).first()
+            if kept is None:
+                row.ingredient_id = duplicate['keep_id']
+                row.save(update_fields=('ingredient',))
+            else:
+                kept.amount += row.amount
+                kept.save(update_fields=('amount',))
+                row.delete()
+        extra.delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0002_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            merge_duplicate_ingredients, migrations.RunPython.noop
+        ),
+    ]
@@ -0,0 +1,39 @@
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations
+
+NORMALIZED_NAME = "replace(lower(name), 'ё', 'е')"
+
+CREATE_INDEXES = (
+    'CREATE INDEX IF NOT EXISTS recipes_ingredient_name_trgm '
+    f'ON recipes_ingredient USING gin (({NORMALIZED_NAME}) gin_trgm_ops)',
+    'CREATE INDEX IF NOT EXISTS recipes_ingredient_name_prefix '
+    f'ON recipes_ingredient (({NORMALIZED_NAME}) text_pattern_ops)',
+)
+DROP_INDEXES = (
+    'DROP INDEX IF EXISTS recipes_ingredient_name_trgm',
+    'DROP INDEX IF EXISTS recipes_ingredient_name_prefix',
+)
+
+
+def run_on_postgresql(statements):
+    def operation(apps, schema_editor):
+        if schema_editor.connection.vendor != 'postgresql':
+            return
+        for statement in statements:
+            schema_editor.execute(statement)
+    return operation
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0004_unique_ingredient'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.RunPython(
+            run_on_postgresql(CREATE_INDEXES),
+            run_on_postgresql(DROP_INDEXES),
+        ),
+    ]
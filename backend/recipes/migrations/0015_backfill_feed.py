@@ -0,0 +1,49 @@
+from django.conf import settings
+from django.db import migrations
+
+BATCH_SIZE = 5000
+
+
+def backfill_feed(apps, schema_editor):
+    """Ленты по существующим подпискам, как после rebuild_feed."""
+    Recipe = apps.get_model('recipes', 'Recipe')
+    FeedEntry = apps.get_model('recipes', 'FeedEntry')
+    User = apps.get_model('users', 'User')
+    Follow = apps.get_model('users', 'Follow')
+    if FeedEntry.objects.exists():
+        return
+    authors = list(User.objects.filter(
+        followers_count__gt=0,
+        followers_count__lte=settings.FEED_FANOUT_LIMIT,
+    ).order_by('id').values_list('id', flat=True))
+    entries = []
+    for author_id in authors:
+        recipes = list(Recipe.objects.filter(author_id=author_id).order_by(
+            '-pub_date', '-id'
+        ).values_list('id', 'pub_date')[:settings.FEED_BACKFILL])
+        if not recipes:
+            continue
+        for user_id in Follow.objects.filter(
+            author_id=author_id
+        ).values_list('user_id', flat=True):
+            entries += [
+                FeedEntry(user_id=user_id, recipe_id=recipe_id,
+                          pub_date=pub_date)
+                for recipe_id, pub_date in recipes
+            ]
+            if len(entries) >= BATCH_SIZE:
+                FeedEntry.objects.bulk_create(entries, ignore_conflicts=True)
+                entries = []
+    FeedEntry.objects.bulk_create(entries, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0014_feed'),
+        ('users', '0003_user_counters'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_feed, migrations.RunPython.noop),
+    ]
@@ -1,9 +1,21 @@
+from django.conf import settings
+from django.contrib.postgres.aggregates import StringAgg
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVector, SearchVectorField
 from django.core.validators import MinValueValidator
-from django.db import models
+from django.db import connections, models
+from django.db.models import (Exists, F, OuterRef, Prefetch, Subquery, Value,
+                              Window)
+from django.db.models.functions import Coalesce, RowNumber
 
+from recipes.storage import recipe_storage
 from tag.models import Tag
 from users.models import User
 
+# Оценка рецептов, которых нет в RecipePopularity; реальные оценки
+# не меньше нуля.
+NO_POPULARITY = -1.0
+
 
 class Ingredient(models.Model):
     """Модель ингредиентов."""
@@ -21,11 +33,107 @@ class Ingredient(models.Model):
         verbose_name = 'Ингредиент'
         verbose_name_plural = 'Ингредиенты'
         ordering = ('pk',)
+        constraints = (
+            models.UniqueConstraint(
+                fields=('name', 'measurement_unit'),
+                name='unique_ingredient',
+            ),
+        )
 
     def __str__(self):
         return self.name
 
 
+class RecipeQuerySet(models.QuerySet):
+    """Запросы рецептов с подгрузкой связанных данных."""
+
+    def with_user_flags(self, user):
+        """Флаги избранного и списка покупок одним запросом."""
+        if user.is_anonymous:
+            return self.annotate(
+                is_favorited=Value(False, models.BooleanField()),
+                is_in_shopping_cart=Value(False, models.BooleanField()),
+            )
+        return self.annotate(
+            is_favorited=Exists(FavoriteRecipe.objects.filter(
+                user=user, recipe=OuterRef('pk')
+            )),
+            is_in_shopping_cart=Exists(ShoppingCart.objects.filter(
+                user=user, recipe=OuterRef('pk')
+            )),
+        )
+
+    def for_display(self, user):
+        """Рецепты для отображения без запросов на каждый объект."""
+        return self.with_user_flags(user).defer(
+            'search_vector'
+        ).prefetch_related(
+            Prefetch('author', queryset=User.objects.with_is_subscribed(user)),
+            'tags',
+            Prefetch(
+                'recipe_ingredient',
+                queryset=RecipeIngredient.objects.select_related('ingredient'),
+            ),
+        )
+
+    def by_popularity(self):
+        """
+        Сначала популярные; рецепты без оценки идут последними.
+        """
+        return self.annotate(popularity_score=Coalesce(
+            'popularity__score', Value(NO_POPULARITY)
+        )).order_by('-popularity_score', '-id')
+
+    def update_search_vector(self):
+        """
+        Пересчёт поискового вектора по названию, тексту и ингредиентам.
+
+        Полнотекстовый поиск есть только в PostgreSQL.
+        """
+        if connections[self.db].vendor != 'postgresql':
+            return 0
+        config = settings.SEARCH_CONFIG
+        ingredient_names = Subquery(
+            RecipeIngredient.objects.filter(recipe=OuterRef('pk'))
+            .order_by()
+            .values('recipe')
+            .annotate(names=StringAgg('ingredient__name', ' '))
+            .values('names')
+        )
+        return self.update(search_vector=(
+            SearchVector('name', weight='A', config=config)
+            + SearchVector('text', weight='B', config=config)
+            + SearchVector(
+                Coalesce(ingredient_names, Value('')),
+                weight='C', config=config,
+            )
+        ))
+
+    def latest_for_authors(self, author_ids, limit):
+        """
+        Последние рецепты каждого из авторов одним оконным запросом.
+
+        Django 3.2 не умеет фильтровать по оконной функции,
+        поэтому внешний запрос с условием на номер строки пишется вручную.
+        """
+        if not author_ids:
+            return self.none()
+        ranked = self.filter(author_id__in=author_ids).annotate(
+            row_number=Window(
+                RowNumber(),
+                partition_by=F('author_id'),
+                order_by=(F('pub_date').desc(), F('id').desc()),
+            )
+        ).order_by()
+        sql, params = ranked.query.sql_with_params()
+        return self.model.objects.raw(
+            f'SELECT * FROM ({sql}) AS ranked '
+            'WHERE ranked.row_number <= %s '
+            'ORDER BY ranked.author_id, ranked.row_number',
+            (*params, limit),
+        )
+
+
 class Recipe(models.Model):
     """Модель рецептов."""
 
@@ -54,6 +162,7 @@ class Recipe(models.Model):
     image = models.ImageField(
         verbose_name='Картинка',
         upload_to='recipes/',
+        storage=recipe_storage,
     )
     text = models.TextField(
         verbose_name='Текст',
@@ -68,11 +177,43 @@ class Recipe(models.Model):
         'Дата публикации рецепта',
         auto_now_add=True,
     )
+    favorites_count = models.PositiveIntegerField(
+        verbose_name='Добавлений в избранное',
+        default=0,
+        editable=False,
+    )
+    image_renditions = models.JSONField(
+        verbose_name='Уменьшенные копии картинки',
+        default=dict,
+        blank=True,
+        editable=False,
+    )
+    search_vector = SearchVectorField(
+        verbose_name='Поисковый вектор',
+        null=True,
+        editable=False,
+    )
+
+    objects = RecipeQuerySet.as_manager()
 
     class Meta:
         verbose_name = 'Рецепт'
         verbose_name_plural = "Рецепты"
         ordering = ('-pub_date',)
+        indexes = (
+            models.Index(
+                fields=('-pub_date', '-id'),
+                name='recipe_pub_date_id_idx',
+            ),
+            models.Index(
+                fields=('author', '-pub_date', '-id'),
+                name='recipe_author_pub_date_idx',
+            ),
+            GinIndex(
+                fields=('search_vector',),
+                name='recipe_search_vector_idx',
+            ),
+        )
 
     def __str__(self):
         return self.name
@@ -130,6 +271,11 @@ class FavoriteRecipe(models.Model):
         on_delete=models.CASCADE,
         related_name='favorites',
     )
+    created = models.DateTimeField(
+        'Дата добавления',
+        auto_now_add=True,
+        db_index=True,
+    )
 
     class Meta:
         verbose_name = 'Избранное'
@@ -159,6 +305,11 @@ class ShoppingCart(models.Model):
         on_delete=models.CASCADE,
         related_name='shopping_cart',
     )
+    created = models.DateTimeField(
+        'Дата добавления',
+        auto_now_add=True,
+        db_index=True,
+    )
 
     class Meta:
         verbose_name = 'Покупка'
@@ -170,3 +321,73 @@ class ShoppingCart(models.Model):
 
     def __str__(self):
         return f'Рецепт {self.recipe} добавлен в корзину.'
+
+
+class RecipePopularity(models.Model):
+    """
+    Популярность рецепта по избранному и спискам покупок.
+
+    Score — двоичный логарифм взвешенной суммы добавлений, где каждое
+    добавление весит 2 ** (время от EPOCH из api.popularity
+    в периодах полураспада). Порядок по score совпадает с порядком по сумме
+    с затуханием на любой момент, поэтому пересчитывать нужно только
+    рецепты с новыми добавлениями.
+    """
+
+    recipe = models.OneToOneField(
+        Recipe,
+        verbose_name='Рецепт',
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='popularity',
+    )
+    score = models.FloatField(verbose_name='Популярность')
+    updated = models.DateTimeField('Дата пересчёта', db_index=True)
+
+    class Meta:
+        verbose_name = 'Популярность рецепта'
+        verbose_name_plural = 'Популярность рецептов'
+
+    def __str__(self):
+        return f'{self.recipe_id}: {self.score:.2f}'
+
+
+class FeedEntry(models.Model):
+    """
+    Рецепт в ленте подписчика автора.
+
+    Записи создаются при публикации рецепта (fan-out on write), кроме
+    рецептов авторов с числом подписчиков больше FEED_FANOUT_LIMIT:
+    их рецепты читаются в ленту напрямую.
+    """
+
+    user = models.ForeignKey(
+        User,
+        verbose_name='Подписчик',
+        on_delete=models.CASCADE,
+        related_name='feed',
+    )
+    recipe = models.ForeignKey(
+        Recipe,
+        verbose_name='Рецепт',
+        on_delete=models.CASCADE,
+        related_name='feed_entries',
+    )
+    pub_date = models.DateTimeField('Дата публикации рецепта')
+
+    class Meta:
+        verbose_name = 'Запись ленты'
+        verbose_name_plural = 'Записи ленты'
+        constraints = (
+            models.UniqueConstraint(fields=('user', 'recipe'),
+                                    name='unique_feed_entry'),
+        )
+        indexes = (
+            models.Index(
+                fields=('user', '-pub_date', '-recipe'),
+                name='feed_user_pub_date_idx',
+            ),
+        )
+
+    def __str__(self):
+        return f'Рецепт {self.recipe_id} в ленте {self.user_id}'
@@ -0,0 +1,41 @@
+import hashlib
+import os
+
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+HASH_LENGTH = 32
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    Хранилище, в котором имя файла — хэш его содержимого.
+
+    Одинаковые файлы сохраняются один раз, а содержимое по одному
+    адресу никогда не меняется.
+    """
+
+    def content_name(self, name, content):
+        digest = hashlib.sha256()
+        for chunk in content.chunks():
+            digest.update(chunk)
+        if hasattr(content, 'seek'):
+            content.seek(0)
+        directory, file_name = os.path.split(name)
+        _, extension = os.path.splitext(file_name)
+        return os.path.join(
+            directory, digest.hexdigest()[:HASH_LENGTH] + extension.lower()
+        )
+
+    def _save(self, name, content):
+        name = self.content_name(name, content)
+        if self.exists(name):
+            # clean_media не удаляет свежие файлы: повторная загрузка
+            # продлевает жизнь файлу, на который ещё нет ссылок.
+            os.utime(self.path(name))
+            return name
+        return super()._save(name, content)
+
+
+recipe_storage = ContentAddressedStorage()
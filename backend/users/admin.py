@@ -11,8 +11,11 @@ class UserAdmin(admin.ModelAdmin):
         'first_name',
         'last_name',
         'email',
+        'recipes_count',
+        'followers_count',
     )
     list_filter = ('email', 'username')
+    readonly_fields = ('recipes_count', 'followers_count')
 
 
 @admin.register(Follow)
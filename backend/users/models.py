@@ -1,5 +1,24 @@
-from django.contrib.auth.models import AbstractUser
+from django.contrib.auth.models import AbstractUser, UserManager
 from django.db import models
+from django.db.models import Exists, OuterRef, Value
+
+
+class UserQuerySet(models.QuerySet):
+    """Запросы пользователей."""
+
+    def with_is_subscribed(self, user):
+        """Флаг подписки текущего пользователя одним запросом."""
+        if user.is_anonymous:
+            return self.annotate(
+                is_subscribed=Value(False, models.BooleanField())
+            )
+        return self.annotate(is_subscribed=Exists(Follow.objects.filter(
+            user=user, author=OuterRef('pk')
+        )))
+
+
+class FoodgramUserManager(UserManager.from_queryset(UserQuerySet)):
+    """Менеджер пользователей с дополнительными запросами."""
 
 
 class User(AbstractUser):
@@ -29,6 +48,18 @@ class User(AbstractUser):
         max_length=150,
         help_text='Введите пароль',
     )
+    recipes_count = models.PositiveIntegerField(
+        verbose_name='Количество рецептов',
+        default=0,
+        editable=False,
+    )
+    followers_count = models.PositiveIntegerField(
+        verbose_name='Количество подписчиков',
+        default=0,
+        editable=False,
+    )
+
+    objects = FoodgramUserManager()
 
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = ('username', 'first_name', 'last_name')